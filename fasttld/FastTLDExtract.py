@@ -8,22 +8,67 @@
 Copyright (c) 2022 Wu Tingfeng
 Copyright (c) 2017-2018 Jophy
 """
+import os.path
 import re
-import socket
-from collections import namedtuple
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from types import MappingProxyType
 
-import idna
+try:
+    # The C module behind socket, which imports much faster than socket
+    from _socket import AF_INET6, inet_aton, inet_pton
+except ImportError:
+    from socket import AF_INET6, inet_aton, inet_pton
 
-from fasttld.psl import getPublicSuffixList, update
+from fasttld import psl
+from fasttld.psl import (PSL_FILE_PATH, getFileDigest, getPublicSuffixList, loadCompactTrie,
+                         loadTrieSnapshot, saveCompactTrie, saveTrieSnapshot, update)
 
+# Dotted decimal IPv4 addresses.
+# Unused since looks_like_ip() checks addresses with inet_aton(), kept only for code importing it.
 IP_RE = re.compile(
     r"^(([0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])\.){3}"
     r"([0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])$"
 )
 
-# Characters valid in scheme names
+# First characters of hosts that may be IP addresses. IPv6 addresses must be in brackets, eg. [::1]
+IP_FIRST_CHARS = frozenset("0123456789[")
+IP_FIRST_BYTES = frozenset(char.encode("ascii") for char in IP_FIRST_CHARS)
+DIGITS = frozenset("0123456789")
+
+# Hosts inet_aton() may accept: IPv4 characters, up to the end or a whitespace (inet_aton ignores what follows)
+IPV4_CHARS_RE = re.compile(r"[0-9A-Fa-fXx.]+(?:[ \t\n\v\f\r]|\Z)")
+
+# Characters valid in scheme names.
+# Unused since extract() splits URLs with URL_RE, kept only for code importing it.
 SCHEME_RE = re.compile(r"^[A-Za-z0-9+-.]+://")
 
+# Scheme, userinfo (up to the first "@"), host (an IPv6 address in brackets, or up to the first of ":/?&#"),
+# and the rest of a URL
+URL_RE = re.compile(r"([A-Za-z0-9+-.]+://)?(?:([^@]*)@)?(\[[0-9A-Fa-f:.]+\]|[^:/?&#]*)(.*)", re.DOTALL)
+
+# URL_RE for bytes-like input, see extract_bytes(). Most URLs have no "@", which leaves the userinfo group
+# out of the match. Without it, the regex is not tried and backtracked at every position of the URL.
+BYTES_URL_RE = re.compile(URL_RE.pattern.encode("ascii"), re.DOTALL)
+BYTES_URL_NO_USERINFO_RE = re.compile(URL_RE.pattern.replace("(?:([^@]*)@)?", "()").encode("ascii"), re.DOTALL)
+
+# What extract() strips from the ends of URLs, for bytes-like input: these characters, and the UTF-8 BOM.
+# STRIP_EDGE_BYTES are all their bytes. URLs that lose nothing to bytes.strip(STRIP_EDGE_BYTES) need no stripping.
+STRIP_BYTES = b". \n\t\r"
+BOM_BYTES = "\uFEFF".encode("utf-8")
+STRIP_EDGE_BYTES = STRIP_BYTES + BOM_BYTES
+# (start, end) of empty fields in the results of extract_bytes(spans=True)
+EMPTY_SPAN = (0, 0)
+
+# Label separators recognised by IDNA
+IDNA_DOTS_RE = re.compile("[\u3002\uff0e\uff61]")
+
+# Number of punycode-encoded labels cached by format()
+IDNA_CACHE_SIZE = 4096
+
 TLDResult = namedtuple(
     "TLDResult",
     [
@@ -38,19 +83,53 @@ TLDResult = namedtuple(
     ],
 )
 
+HostResult = namedtuple("HostResult", ["subdomain", "domain", "suffix", "domain_name"])
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+DedupInfo = namedtuple("DedupInfo", ["rows", "unique", "ratio"])
+
+_MISSING = object()
+
+# Compiled trie nodes, see FastTLDExtract._trie_compile()
+NO_EXCEPTIONS = frozenset()
+END_NODE = (None, False, NO_EXCEPTIONS)
+
 
 def looks_like_ip(maybe_ip):
-    """Does the given str look like an IP address?"""
-    try:
-        socket.inet_aton(maybe_ip)
+    """
+    Does the given str look like an IP address?
+    Accepts what socket.inet_aton() accepts, and IPv6 addresses in brackets, eg. [::1]
+    Host names are told apart by their first and last characters, without raising exceptions.
+    """
+    if maybe_ip[:1] not in IP_FIRST_CHARS:
+        return False
+    if maybe_ip[0] == "[":
+        # Host names never start with "[", so there is no need to avoid the exception here
+        if maybe_ip[-1] != "]":
+            return False
+        try:
+            inet_pton(AF_INET6, maybe_ip[1:-1])
+        except (OSError, ValueError):
+            return False
         return True
-    except socket.error:  # for Python 2 compatibility
-        pass
-    except (AttributeError, UnicodeError, ValueError):
-        if IP_RE.match(maybe_ip):
-            return True
+    # Suffixes never end with a digit, so this leaves dotted decimal addresses to inet_aton() right away.
+    # The rest are checked for characters of hexadecimal or octal addresses first.
+    if maybe_ip[-1] not in DIGITS and IPV4_CHARS_RE.match(maybe_ip) is None:
+        return False
+    try:
+        inet_aton(maybe_ip)
+    except (OSError, ValueError):
+        return False
+    return True
+
 
-    return False
+@lru_cache(maxsize=IDNA_CACHE_SIZE)
+def idna_label(label):
+    """Punycode-encode a single non-ASCII host label, eg. 食狮 -> xn--85x722f"""
+    # idna is only imported once format() meets a non-ASCII host
+    import idna
+    return idna.encode(label).decode()
 
 
 def check_numeric(maybe_numeric):
@@ -61,12 +140,396 @@ def check_numeric(maybe_numeric):
     return True
 
 
+def check_port_bytes(maybe_port):
+    """Is the given bytes a port number, as extract() checks it?"""
+    if maybe_port.isdigit():
+        return int(maybe_port) <= 65535
+    # int() only reads non-ASCII digits from str
+    maybe_port = maybe_port.decode("utf-8", "surrogateescape")
+    return check_numeric(maybe_port) and 0 <= int(maybe_port) <= 65535
+
+
+def strip_span(url):
+    """
+    Find what is left of a UTF-8 encoded URL after stripping the characters extract() strips, ". \n\t\r\uFEFF".
+    :return: Tuple(start, end) of the stripped URL in url
+    """
+    start, end = 0, len(url)
+    while start < end:
+        if url[start] in STRIP_BYTES:
+            start += 1
+        elif url.startswith(BOM_BYTES, start, end):
+            start += 3
+        else:
+            break
+    while start < end:
+        if url[end - 1] in STRIP_BYTES:
+            end -= 1
+        elif url.endswith(BOM_BYTES, start, end):
+            end -= 3
+        else:
+            break
+    return start, end
+
+
+class LRUCache(object):
+    """
+    Size-bounded cache with approximate least recently used eviction, and hit/miss/eviction counters.
+    Hits are a plain dict lookup, without locking. Only misses take the lock, to insert the new entry and
+    evict: entries go in insertion order, except that those hit since they were inserted or last passed over
+    get a second chance at the end (the CLOCK algorithm), so that frequently hit keys stay.
+    The counters are not locked either, so concurrent threads may miss a few increments.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._data = OrderedDict()
+        # Keys hit since they were inserted or last passed over by eviction
+        self._referenced = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._referenced.add(key)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            data = self._data
+            referenced = self._referenced
+            if key not in data and len(data) >= self.maxsize:
+                # Oldest entries first. Referenced ones move to the end and lose their reference,
+                # so this ends after at most one round
+                while True:
+                    oldest, oldest_value = data.popitem(last=False)
+                    if oldest not in referenced:
+                        self.evictions += 1
+                        break
+                    referenced.discard(oldest)
+                    data[oldest] = oldest_value
+                if len(referenced) > len(data):
+                    # Keys a concurrent get() referenced while they were evicted
+                    referenced.intersection_update(data)
+            data[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._referenced.clear()
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._data))
+
+
+class ExtractStats(object):
+    """
+    Counters of FastTLDExtract(stats=True), see FastTLDExtract.stats().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+        self.trie_builds = 0
+        self.trie_build_seconds = 0.0
+        self.trie_bytes = 0
+
+    def clear(self):
+        """Reset the lookup and format() counters. The figures of the last trie construction are kept."""
+        with self._lock:
+            self.lookups = self.ip_addresses = self.unmatched = self.wildcard_hits = self.exception_hits = 0
+            self.format_calls = 0
+            self.format_seconds = 0.0
+
+    def record_lookup(self, host, rule):
+        """
+        :param host: Result of a host lookup, None for an IP address.
+        :param rule: "wildcard" or "exception" if the suffix was matched by such a rule, else None.
+        """
+        with self._lock:
+            self.lookups += 1
+            if host is None:
+                self.ip_addresses += 1
+            elif not host[2]:
+                self.unmatched += 1
+            elif rule == "wildcard":
+                self.wildcard_hits += 1
+            elif rule == "exception":
+                self.exception_hits += 1
+
+    def record_format(self, seconds):
+        with self._lock:
+            self.format_calls += 1
+            self.format_seconds += seconds
+
+    def record_trie_build(self, seconds, size):
+        with self._lock:
+            self.trie_builds += 1
+            self.trie_build_seconds = seconds
+            self.trie_bytes = size
+
+    def as_dict(self):
+        with self._lock:
+            return dict((key, value) for key, value in vars(self).items() if not key.startswith("_"))
+
+
 class FastTLDExtract(object):
-    def __init__(self, exclude_private_suffix=False, file_path=""):
-        self.trie = self._trie_construct(exclude_private_suffix, file_path)
+    def __init__(self, exclude_private_suffix=False, file_path="", snapshot=True, auto_update=False,
+                 cache_size=0, engine="dict", lazy=False, stats=False):
+        """
+        :param exclude_private_suffix: Leave private domains like blogspot.co.uk out of the trie.
+        :param file_path: Path to a public suffix list file. Defaults to the bundled copy.
+        :param snapshot: Load the trie from a precompiled snapshot of the public suffix list file,
+        writing one if it is missing or stale. See psl.saveTrieSnapshot().
+        :param auto_update: If the bundled public suffix list is more than 3 days old, download a new one
+        in a background thread and swap the new trie in once it is built. extract() keeps using the
+        current trie in the meantime. Ignored when file_path is given.
+        :param cache_size: Cache the lookup results of up to cache_size distinct hosts, so that repeated
+        hosts skip the trie walk. 0 disables the cache. See cache_info().
+        :param engine: "dict" keeps the trie as nested dicts (fastest).
+        "compact" packs it into a flat buffer searched by binary search, see compact.CompactTrie.
+        It uses several times less memory than "dict", but lookups are slower. See memory_usage().
+        "mmap" is "compact" with the buffer in a read-only memory-mapped file next to the public suffix list
+        file (see psl.getSnapshotPath()), so that all processes using it share one copy in physical memory.
+        :param lazy: Defer building the trie until it is first used, eg. by the first extract() call,
+        so that constructing the instance is cheap. self.trie is None until then.
+        :param stats: Count lookups, IP addresses, wildcard and exception rule hits and unmatched suffixes,
+        and time format() and trie construction. See stats(). When False, none of this costs anything.
+        """
+        lookups = {"dict": self._lookup_host, "compact": self._lookup_host_compact,
+                   "mmap": self._lookup_host_compact}
+        # Suffix offset in a UTF-8 encoded host, used by extract_bytes()
+        suffix_finders = {"dict": self._find_suffix_bytes, "compact": self._find_suffix_bytes_compact,
+                          "mmap": self._find_suffix_bytes_compact}
+        if engine not in lookups:
+            raise ValueError("Unknown engine %r. Valid engines: %s" % (engine, ", ".join(sorted(lookups))))
+        self.engine = engine
+        self.exclude_private_suffix = exclude_private_suffix
+        self.file_path = file_path
+        self.snapshot = snapshot
+        self._file_digest = None
+        self._reload_lock = threading.Lock()
+        self._cache = self._cache_construct(cache_size) if cache_size > 0 else None
+        self._stats = self._stats_construct() if stats else None
+        # Host lookup used by all extract methods, see _lookup_host()
+        self._lookup_uncached = lookups[engine]
+        self._find_suffix = suffix_finders[engine]
+        if self._cache is not None or self._stats is not None:
+            self._find_suffix = self._find_suffix_bytes_decoded
+        self._lookup_loaded = self._lookup_uncached if self._cache is None else self._lookup_host_cached
+        # format() used by extract()
+        self._format = self.format
+        if self._stats is not None:
+            self._lookup_counted = self._lookup_loaded
+            self._lookup_loaded = self._lookup_host_stats
+            self._format = self._format_timed
+        # The dict engine walks _compiled_trie, the compact engines look up hosts in _compact_trie
+        self._compiled_trie = self._compact_trie = self._trie_dict = None
+        self._suffix_index = self._bytes_trie = None
+        if lazy:
+            self._lookup = self._lookup_host_lazy
+        else:
+            self._lookup = self._lookup_loaded
+            self.reload()
+        if auto_update and not file_path:
+            psl.auto_update(background=True, callback=self.reload)
+
+    def reload(self):
+        """
+        Rebuild the trie if the content of the public suffix list file has changed since it was last built.
+        The new trie is fully built before it is published with a single attribute assignment,
+        so concurrent extract() calls see either the old or the new trie, never a partial one.
+        :return: True if the trie was rebuilt, False if the file content is unchanged.
+        """
+        with self._reload_lock:
+            file_path = self.file_path or PSL_FILE_PATH
+            digest = getFileDigest(file_path) if os.path.isfile(file_path) else None
+            if digest is not None and digest == self._file_digest:
+                return False
+            build_start = time.perf_counter()
+            compiled = compact = None
+            if self.engine == "mmap":
+                compact = self._compact_trie_map(file_path, digest)
+            elif self.engine == "compact":
+                from fasttld.compact import CompactTrie
+                compact = CompactTrie.from_trie(self._trie_load(file_path, digest)[0], digest or "")
+            else:
+                # Only the compiled trie is kept. The trie dict is rebuilt if read, see the trie property
+                compiled = self._trie_load(file_path, digest)[1]
+            self._trie_dict = self._suffix_index = None
+            self._compiled_trie = compiled
+            self._compact_trie = compact
+            self._file_digest = digest
+            if self._cache is not None:
+                # A new cache rather than clear(): lookups still walking the old trie put their results
+                # into the cache they started with, see _lookup_host_cached()
+                self._cache = self._cache_construct(self._cache.maxsize)
+            if self._stats is not None:
+                self._stats.record_trie_build(time.perf_counter() - build_start, self.memory_usage())
+            self._lookup = self._lookup_loaded
+            return True
+
+    def _cache_construct(self, cache_size):
+        """:return: The host cache enabled with cache_size, see _lookup_host_cached()"""
+        return LRUCache(cache_size)
+
+    def _stats_construct(self):
+        """:return: The counters enabled with stats=True, see stats()"""
+        return ExtractStats()
+
+    def _ensure_trie(self):
+        """Build the trie if construction was deferred with lazy=True."""
+        if self._compiled_trie is None and self._compact_trie is None:
+            self.reload()
+
+    @property
+    def trie(self):
+        """
+        The trie of this instance, or None until the trie of a lazy=True instance is built.
+        For the dict engine, a trie dict as built by _trie_construct(). Host lookups only need the compiled trie
+        (see _trie_compile()), so the trie dict is rebuilt when first read after each reload(), eg. from the
+        snapshot, and kept until the next reload().
+        For the compact engines, the CompactTrie.
+        """
+        if self.engine != "dict":
+            return self._compact_trie
+        trie = self._trie_dict
+        if trie is None and self._compiled_trie is not None:
+            with self._reload_lock:
+                trie = self._trie_dict
+                if trie is None:
+                    file_path = self.file_path or PSL_FILE_PATH
+                    trie = self._trie_dict = self._trie_load(file_path, self._file_digest)[0]
+        return trie
+
+    def _compact_trie_map(self, file_path, digest):
+        """
+        Map the compact trie file of the public suffix list file, writing it first if it is missing or stale.
+        Falls back to an in-memory CompactTrie if the file cannot be written.
+        :return: CompactTrie
+        """
+        from fasttld.compact import CompactTrie, pack_trie
+        if digest is not None:
+            trie = loadCompactTrie(file_path, self.exclude_private_suffix, digest)
+            if trie is not None:
+                return trie
+        buf = pack_trie(self._trie_load(file_path, digest)[0], digest or "")
+        if digest is not None and saveCompactTrie(file_path, self.exclude_private_suffix, buf):
+            trie = loadCompactTrie(file_path, self.exclude_private_suffix, digest)
+            if trie is not None:
+                return trie
+        return CompactTrie(buf)
+
+    def memory_usage(self):
+        """
+        Estimate the memory used by the trie of this instance.
+        :return: Size in bytes
+        """
+        self._ensure_trie()
+        if self.engine != "dict":
+            return self._compact_trie.memory_usage()
+        # The dict engine only keeps the compiled trie, see _trie_compile()
+        size = 0
+        seen = set()
+        stack = [self._compiled_trie]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+            if isinstance(obj, MappingProxyType):
+                # Read-only view of a dict, see shared.SharedFastTLDExtract
+                size += sys.getsizeof(obj.copy())
+            if isinstance(obj, (dict, MappingProxyType)):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (tuple, frozenset)):
+                stack.extend(obj)
+        return size
+
+    def suffix_index(self):
+        """
+        Get the query index of the suffixes of the trie, eg. for checking many strings with is_public_suffix().
+        It is built on first use, and again after the trie is rebuilt by reload().
+        :return: index.SuffixIndex
+        >>> index = FastTLDExtract().suffix_index()
+        >>> index.is_public_suffix('co.uk'), index.children('uk')[:2], index.wildcard_rules[:2]
+        >>> (True, ('ac.uk', 'barsy.uk'), ('*.0emm.com', '*.advisor.ws'))
+        """
+        self._ensure_trie()
+        index = self._suffix_index
+        if index is None:
+            from fasttld.index import SuffixIndex
+            with self._reload_lock:
+                if self._suffix_index is None:
+                    # The trie dict, without keeping it for the dict engine, see the trie property
+                    trie = self._trie_dict
+                    if trie is None:
+                        file_path = self.file_path or PSL_FILE_PATH
+                        trie = self._trie_load(file_path, self._file_digest)[0]
+                    self._suffix_index = SuffixIndex(trie)
+                index = self._suffix_index
+        return index
+
+    def is_public_suffix(self, s):
+        """
+        Is the given str itself a public suffix? Matching follows extract(), see index.SuffixIndex.
+        For many strings, call suffix_index().is_public_suffix() instead.
+        >>> FastTLDExtract().is_public_suffix('co.uk')
+        >>> True
+        """
+        return self.suffix_index().is_public_suffix(s)
+
+    def cache_info(self):
+        """
+        Report statistics of the host cache enabled with cache_size.
+        reload() starts a new cache along with a new trie, so the counters restart then.
+        :return: NamedTuple(hits, misses, evictions, maxsize, currsize), or None if the cache is disabled.
+        """
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def cache_clear(self):
+        """Empty the host cache enabled with cache_size."""
+        if self._cache is not None:
+            self._cache.clear()
+
+    def stats(self):
+        """
+        Report the counters enabled with stats=True, eg. for exporting to a metrics system.
+        Host cache statistics are included with a cache_ prefix if the cache is enabled.
+        :return: Dict(name -> number), or None if stats are disabled.
+        >>> FastTLDExtract(stats=True).stats()
+        >>> {'lookups': 0, 'ip_addresses': 0, 'unmatched': 0, 'wildcard_hits': 0, 'exception_hits': 0,
+        >>>  'format_calls': 0, 'format_seconds': 0.0, 'trie_builds': 1, 'trie_build_seconds': 0.006, 'trie_bytes': 1812345}
+        """
+        if self._stats is None:
+            return None
+        stats = self._stats.as_dict()
+        if self._cache is not None:
+            for key, value in self._cache.info()._asdict().items():
+                stats["cache_" + key] = value
+        return stats
+
+    def stats_clear(self):
+        """Reset the counters enabled with stats=True. The trie construction figures are kept."""
+        if self._stats is not None:
+            self._stats.clear()
 
     def update(self, *args, **kwargs):
+        """
+        Update the bundled Public Suffix List, see psl.update().
+        Reloads this instance afterwards unless it was constructed with its own file_path.
+        """
         update(*args, **kwargs)
+        if not self.file_path:
+            self.reload()
 
     def nested_dict(self, dic, keys):
         """
@@ -110,6 +573,55 @@ class FastTLDExtract(object):
                 tld_trie[key] = True
         return tld_trie
 
+    def _trie_compile(self, node):
+        """
+        Flatten the rules of a trie node into a tuple for _lookup_host(), so that each label
+        takes a single dict lookup instead of separate checks for "_END", "*", the label and "!label".
+        :return: Tuple(children, wildcard, exceptions).
+        children: dict of label -> compiled sub-node, or None for an end node.
+        wildcard: True if the node has a "*" rule, eg. *.ck
+        exceptions: frozenset of labels excepted from the wildcard, eg. www for !www.ck
+        """
+        if node is True:
+            return END_NODE
+        wildcard = "*" in node
+        if wildcard and "_END" not in node:
+            # The wildcard takes precedence over any sub-nodes
+            children = {}
+        else:
+            children = dict((label, self._trie_compile(child)) for label, child in node.items())
+        if wildcard:
+            exceptions = frozenset(label[1:] for label in node if label.startswith("!"))
+        else:
+            exceptions = NO_EXCEPTIONS
+        return children, wildcard, exceptions
+
+    def _trie_encode(self, node):
+        """Copy of a node compiled by _trie_compile() with UTF-8 encoded labels, see _find_suffix_bytes()."""
+        children, wildcard, exceptions = node
+        if children is not None:
+            children = dict((label.encode("utf-8"), self._trie_encode(child)) for label, child in children.items())
+        if exceptions:
+            exceptions = frozenset(label.encode("utf-8") for label in exceptions)
+        return children, wildcard, exceptions
+
+    def _trie_load(self, file_path, digest):
+        """
+        Build the trie of a public suffix list file and compile it with _trie_compile().
+        If self.snapshot is True, a snapshot matching the content of the file is loaded instead of parsing it.
+        :param digest: Digest of the file, or None if it is not available.
+        :return: Tuple(trie dict, compiled root node)
+        """
+        if self.snapshot and digest is not None:
+            tries = loadTrieSnapshot(file_path, self.exclude_private_suffix, digest)
+            if tries is not None:
+                return tries
+        trie = self._trie_construct(self.exclude_private_suffix, file_path)
+        tries = trie, self._trie_compile(trie)
+        if self.snapshot and digest is not None:
+            saveTrieSnapshot(file_path, self.exclude_private_suffix, digest, tries)
+        return tries
+
     def __call__(self, *args, **kwargs):
         return self.extract(*args, **kwargs)
 
@@ -126,61 +638,39 @@ class FastTLDExtract(object):
         >>> FastTLDExtract.extract('127.0.0.1', subdomain=True)
         >>> TLDResult(scheme='', userinfo='', subdomain='', domain='127.0.0.1', suffix='', port='', path='', domain_name='127.0.0.1')
         """
-        ret_scheme = ret_userinfo = ret_subdomain = ret_domain = ""
-        ret_suffix = ret_port = ret_path = ret_domain_name = ""
+        ret_scheme = ret_userinfo = ret_port = ret_path = ""
         if format:
-            raw_url = self.format(raw_url)
+            raw_url = self._format(raw_url)
 
         # Borrowed from tldextract library (https://github.com/john-kurkowski/tldextract)
         # Use regex to strip raw_url of scheme subcomponent and anything after host subcomponent
         # Reference: https://en.wikipedia.org/wiki/Uniform_Resource_Identifier#Syntax
 
         netloc_with_scheme = raw_url.strip(". \n\t\r\uFEFF")  # \u200b\u200c\u200d
-        netloc = SCHEME_RE.sub("", netloc_with_scheme)
-
-        ret_scheme = netloc_with_scheme[:len(netloc_with_scheme)-len(netloc)]
 
-        after_host = ""
-
-        # Extract URL userinfo
-        try:
-            at_idx = netloc.index("@")
-        except ValueError:
-            pass
-        else:
-            ret_userinfo = netloc[:at_idx]
-            netloc = netloc[at_idx+1:]
-
-        # Separate URL host from subcomponents thereafter
-        try:
-            host_end_index = next(i for i, c in enumerate(netloc) if c in {':', '/', '?', '&', '#'})
-        except StopIteration:
-            pass
-        else:
-            after_host = netloc[host_end_index:]
-            netloc = netloc[:host_end_index]
+        # Split scheme, userinfo, host and whatever follows the host in a single regex scan
+        ret_scheme, ret_userinfo, netloc, after_host = URL_RE.match(netloc_with_scheme).groups("")
 
         # extract port and "Path" if any
-        if len(after_host):
-            try:
-                path_start_index = after_host.index("/")
-            except ValueError:
-                path_start_index = -1
-            invalid_port = False
+        if after_host:
+            path_start_index = after_host.find("/")
             if after_host[0] == ':':
                 if path_start_index == -1:
                     maybe_port = after_host[1:]
                 else:
                     maybe_port = after_host[1:path_start_index]
-                if not(check_numeric(maybe_port) and 0 <= int(maybe_port) <= 65535):
-                    invalid_port = True
-                else:
+                # isdecimal() spares most ports the exception of a failing int()
+                if (maybe_port.isdecimal() or check_numeric(maybe_port)) and 0 <= int(maybe_port) <= 65535:
                     ret_port = maybe_port
-            if not invalid_port and path_start_index != -1 and path_start_index != len(after_host):
+                    if path_start_index != -1:
+                        ret_path = after_host[path_start_index+1:]
+            elif path_start_index != -1:
                 ret_path = after_host[path_start_index+1:]
 
-        # Determine if raw_url is an IP address
-        if len(netloc) != 0 and looks_like_ip(netloc):
+        host = self._lookup(netloc, subdomain)
+
+        # raw_url is an IP address
+        if host is None:
             return TLDResult(
                 "",
                 "",
@@ -192,84 +682,520 @@ class FastTLDExtract(object):
                 netloc
             )
 
+        ret_subdomain, ret_domain, ret_suffix, ret_domain_name = host
+
+        return TLDResult(
+            ret_scheme,
+            ret_userinfo,
+            ret_subdomain,
+            ret_domain,
+            ret_suffix,
+            ret_port,
+            ret_path,
+            ret_domain_name,
+        )
+
+    def _lookup_host_stats(self, netloc, subdomain):
+        """Host lookup of a stats=True instance. Records the result in self._stats."""
+        host = self._lookup_counted(netloc, subdomain)
+        rule = None
+        if host is not None and host[2]:
+            rule = self._suffix_rule(host[1], host[2])
+        self._stats.record_lookup(host, rule)
+        return host
+
+    def _suffix_rule(self, domain, suffix):
+        """
+        Find out which kind of rule matched a suffix, by looking it up again.
+        :return: "wildcard" if a wildcard rule matched the suffix, eg. *.ck for foo.ck,
+        "exception" if an exception rule stopped a wildcard at the domain, eg. !www.ck for www.ck, else None.
+        """
+        if self.engine == "dict":
+            labels = suffix.split(".")
+            labels.reverse()
+            children, wildcard, exceptions = self._compiled_trie
+            for label in labels:
+                child = children.get(label) if children else None
+                if child is None:
+                    return "wildcard"
+                children, wildcard, exceptions = child
+            return "exception" if wildcard and domain in exceptions else None
+
+        from fasttld.compact import END, WILDCARD
+        find = self._compact_trie.find
+        flags = find(suffix.encode("utf-8", "surrogateescape"))
+        if flags == -1:
+            return "wildcard"
+        if "." in suffix:
+            # The sub-nodes of a wildcard node without "_END" are never visited, see CompactTrie.lookup()
+            parent_flags = find(suffix.partition(".")[2].encode("utf-8", "surrogateescape"))
+            if parent_flags & WILDCARD and not parent_flags & END:
+                return "wildcard"
+        if flags & WILDCARD and find(("!%s.%s" % (domain, suffix)).encode("utf-8", "surrogateescape")) != -1:
+            return "exception"
+        return None
+
+    def _format_timed(self, raw_url):
+        """format() of a stats=True instance. Records its time in self._stats."""
+        start = time.perf_counter()
+        url = self.format(raw_url)
+        self._stats.record_format(time.perf_counter() - start)
+        return url
+
+    def _lookup_host_lazy(self, netloc, subdomain):
+        """Host lookup until the trie of a lazy=True instance is built. Builds it, then gets out of the way."""
+        self._ensure_trie()
+        return self._lookup_loaded(netloc, subdomain)
+
+    def _lookup_host_cached(self, netloc, subdomain):
+        """
+        _lookup_host() through the host cache enabled with cache_size.
+        Results are cached with subdomains, and subdomains are dropped afterwards if not requested.
+        """
+        # Taken before the trie walk, so that a result of a trie replaced by reload() meanwhile
+        # goes to the replaced cache
+        cache = self._cache
+        host = cache.get(netloc, _MISSING)
+        if host is _MISSING:
+            host = self._lookup_uncached(netloc, True)
+            cache.put(netloc, host)
+        if host is not None and not subdomain:
+            host = ("",) + host[1:]
+        return host
+
+    def _lookup_host_compact(self, netloc, subdomain):
+        """_lookup_host() for engine="compact", where self._compact_trie is a CompactTrie."""
+        if netloc[:1] in IP_FIRST_CHARS and looks_like_ip(netloc):
+            return None
+        return self._compact_trie.lookup(netloc, subdomain)
+
+    def _lookup_host(self, netloc, subdomain):
+        """
+        Split a host into subdomain, domain, suffix and domain name by walking the trie.
+        The walk only tracks where the suffix starts in netloc, so the results are plain slices of netloc.
+        :param netloc: Host subcomponent of a URL, without userinfo, port or path.
+        :param subdomain: Output options. See extract().
+        :return: Tuple(subdomain, domain, suffix, domain_name), or None if netloc is an IP address.
+        """
+        ret_subdomain = ret_domain = ret_suffix = ret_domain_name = ""
+
+        # Determine if raw_url is an IP address. Most host names fail the first character check already.
+        if netloc[:1] in IP_FIRST_CHARS and looks_like_ip(netloc):
+            return None
+
         labels = netloc.split(".")
         labels.reverse()
 
-        node = self.trie  # define the root node
-        suffix = []
+        # Start at the compiled root node, see _trie_compile()
+        children, wildcard, exceptions = self._compiled_trie
+        # netloc[suffix_start:] is the suffix. Each suffix label moves it left by the label and its dot
+        netloc_end = suffix_start = len(netloc) + 1
         for label in labels:
-            if node is True:  # or alternatively if type(node) is not dict:
+            if children is None:
                 # This node is an end node.
-                ret_domain = label
                 break
 
-            # This node has sub-nodes and maybe an end-node.
+            # check a TLD in PSL, or a sub node that takes precedence over a wildcard
             # eg. cn -> (cn, gov.cn)
-            if "_END" in node:
-                # check if there is a sub node
-                # eg. gov.cn
-                if label in node:
-                    suffix.append(label)
-                    node = node[label]
-                    continue
-
-            if "*" in node:
-                # check if there is a sub node
-                # eg. www.ck
-                if ("!%s" % label) in node:
-                    ret_domain = label
-                else:
-                    suffix.append(label)
+            child = children.get(label)
+            if child is not None:
+                suffix_start -= len(label) + 1
+                children, wildcard, exceptions = child
+                continue
+
+            # check the wildcard and its exceptions
+            # eg. *.ck except www.ck
+            if wildcard and label not in exceptions:
+                suffix_start -= len(label) + 1
+            break
+
+        if suffix_start != netloc_end:
+            ret_suffix = netloc[suffix_start:]
+            if suffix_start != 0:
+                domain_end = suffix_start - 1
+                domain_start = netloc.rfind(".", 0, domain_end) + 1
+                ret_domain = netloc[domain_start:domain_end]
+                if subdomain and domain_start != 0:
+                    ret_subdomain = netloc[:domain_start - 1]
+                if ret_domain:
+                    ret_domain_name = netloc[domain_start:]
+
+        return ret_subdomain, ret_domain, ret_suffix, ret_domain_name
+
+    def extract_host(self, host, subdomain=True):
+        """
+        Extract subdomain, domain and suffix from a bare host name, eg. from DNS logs.
+        Skips the scheme, userinfo, port and path parsing of extract().
+        :param host: A host name without scheme, userinfo, port or path.
+        :param subdomain: Output options. See extract().
+        :return: NamedTuple(subdomain, domain, suffix, domain_name)
+        >>> FastTLDExtract.extract_host('www.google.com.hk')
+        >>> HostResult(subdomain='www', domain='google', suffix='com.hk', domain_name='google.com.hk')
+        """
+        host = host.strip(". \n\t\r\uFEFF")
+        result = self._lookup(host, subdomain)
+        if result is None:
+            return HostResult("", host, "", host)
+        return HostResult(*result)
+
+    def extract_domain_name(self, host):
+        """
+        Extract the registered domain name from a bare host name.
+        Same as extract_host(host).domain_name, without building the result tuple.
+        :param host: A host name without scheme, userinfo, port or path.
+        :return: The domain name, the host itself if it is an IP address, or "" if it has none.
+        >>> FastTLDExtract.extract_domain_name('www.google.com.hk')
+        >>> 'google.com.hk'
+        """
+        host = host.strip(". \n\t\r\uFEFF")
+        result = self._lookup(host, False)
+        if result is None:
+            return host
+        return result[3]
+
+    def extract_bytes(self, raw_url, subdomain=True, spans=False):
+        """
+        Extract suffix and subdomain from a bytes-like URL, eg. a line or a memoryview of a raw log buffer,
+        without decoding it. The labels of the host are looked up as they are, in a copy of the trie with
+        UTF-8 encoded labels, made on first use (the compact engines are keyed by UTF-8 already).
+        Only with cache_size or stats=True is the host decoded, to go through the cache and counters of extract().
+        Results are parts of raw_url: slices of raw_url, which for a memoryview refer to its buffer
+        without copying, or (start, end) offsets into raw_url. Empty fields have start == end.
+        Same results as extract(raw_url.decode("utf-8", "surrogateescape")) with format=False, encoded to UTF-8.
+        :param raw_url: bytes, bytearray or memoryview of a URL.
+        :param subdomain: Output options. See extract().
+        :param spans: To return (start, end) offsets instead of slices.
+        :return: NamedTuple(scheme, userinfo, subdomain, domain, suffix, port, path, domain_name)
+        >>> FastTLDExtract.extract_bytes(b'https://www.google.com.hk:8080/a')
+        >>> TLDResult(scheme=b'https://', userinfo=b'', subdomain=b'www', domain=b'google', suffix=b'com.hk', port=b'8080', path=b'a', domain_name=b'google.com.hk')
+
+        >>> FastTLDExtract.extract_bytes(b'https://www.google.com.hk:8080/a', spans=True).domain_name
+        >>> (12, 25)
+        """
+        if not spans and type(raw_url) is bytes:
+            # extract() for bytes, see there. Inlined, as is the rest, to save the cost of a call
+            url = raw_url
+            if len(url.strip(STRIP_EDGE_BYTES)) != len(url):
+                start, end = strip_span(url)
+                url = url[start:end]
+            url_re = BYTES_URL_RE if b"@" in url else BYTES_URL_NO_USERINFO_RE
+            ret_scheme, ret_userinfo, netloc, after_host = url_re.match(url).groups(b"")
+
+            ret_port = ret_path = b""
+            if after_host:
+                path_start_index = after_host.find(b"/")
+                if after_host[0] == 58:  # ":"
+                    if path_start_index == -1:
+                        maybe_port = after_host[1:]
+                    else:
+                        maybe_port = after_host[1:path_start_index]
+                    if check_port_bytes(maybe_port):
+                        ret_port = maybe_port
+                        if path_start_index != -1:
+                            ret_path = after_host[path_start_index+1:]
+                elif path_start_index != -1:
+                    ret_path = after_host[path_start_index+1:]
+
+            suffix_start = self._find_suffix(netloc)
+
+            # raw_url is an IP address
+            if suffix_start is None:
+                return tuple.__new__(TLDResult, (b"", b"", b"", netloc, b"", b"", b"", netloc))
+
+            ret_subdomain = ret_domain = ret_suffix = ret_domain_name = b""
+            if suffix_start != -1:
+                ret_suffix = netloc[suffix_start:]
+                if suffix_start != 0:
+                    domain_end = suffix_start - 1
+                    domain_start = netloc.rfind(b".", 0, domain_end) + 1
+                    ret_domain = netloc[domain_start:domain_end]
+                    if subdomain and domain_start != 0:
+                        ret_subdomain = netloc[:domain_start - 1]
+                    if ret_domain:
+                        ret_domain_name = netloc[domain_start:]
+
+            return tuple.__new__(TLDResult, (ret_scheme, ret_userinfo, ret_subdomain, ret_domain, ret_suffix,
+                                             ret_port, ret_path, ret_domain_name))
+
+        # Offsets, which also make the slices of a bytearray or memoryview.
+        # A memoryview is parsed from a copy of its bytes, as it has no strip(). The offsets are the same.
+        url = raw_url if type(raw_url) is bytes else bytes(raw_url)
+        start, end = 0, len(url)
+        if len(url.strip(STRIP_EDGE_BYTES)) != end:
+            start, end = strip_span(url)
+        url_re = BYTES_URL_RE if b"@" in url else BYTES_URL_NO_USERINFO_RE
+        match = url_re.match(url, start, end)
+        scheme, userinfo, netloc, after_host = match.groups(b"")
+        # Spans of scheme, userinfo, host and whatever follows the host
+        ret_scheme = (start, start + len(scheme))
+        host_start = match.start(3)
+        # userinfo ends right before the "@" in front of the host
+        ret_userinfo = (host_start - 1 - len(userinfo), host_start - 1) if userinfo else EMPTY_SPAN
+        host_end = host_start + len(netloc)
+
+        ret_port = ret_path = EMPTY_SPAN
+        if after_host:
+            path_start_index = after_host.find(b"/")
+            if after_host[0] == 58:  # ":"
+                port_end = end if path_start_index == -1 else host_end + path_start_index
+                if check_port_bytes(url[host_end + 1:port_end]):
+                    ret_port = (host_end + 1, port_end)
+                    if path_start_index != -1:
+                        ret_path = (port_end + 1, end)
+            elif path_start_index != -1:
+                ret_path = (host_end + path_start_index + 1, end)
+
+        suffix_start = self._find_suffix(netloc)
+
+        ret_subdomain = ret_domain = ret_suffix = ret_domain_name = EMPTY_SPAN
+        if suffix_start is None:
+            # raw_url is an IP address
+            ret_scheme = ret_userinfo = ret_port = ret_path = EMPTY_SPAN
+            ret_domain = ret_domain_name = (host_start, host_end)
+        elif suffix_start != -1:
+            ret_suffix = (host_start + suffix_start, host_end)
+            if suffix_start != 0:
+                domain_end = suffix_start - 1
+                domain_start = netloc.rfind(b".", 0, domain_end) + 1
+                ret_domain = (host_start + domain_start, host_start + domain_end)
+                if subdomain and domain_start != 0:
+                    ret_subdomain = (host_start, host_start + domain_start - 1)
+                if domain_start != domain_end:
+                    ret_domain_name = (host_start + domain_start, host_end)
+
+        result = tuple.__new__(TLDResult, (ret_scheme, ret_userinfo, ret_subdomain, ret_domain, ret_suffix,
+                                           ret_port, ret_path, ret_domain_name))
+        if spans:
+            return result
+        # Slices of a memoryview refer to its buffer
+        return tuple.__new__(TLDResult, [raw_url[field_start:field_end] for field_start, field_end in result])
+
+    def _find_suffix_bytes(self, netloc):
+        """
+        _lookup_host() for extract_bytes(): walk a copy of the compiled trie with UTF-8 encoded labels
+        along the labels of a UTF-8 encoded host. The copy is made when first needed for each trie.
+        :return: Offset in netloc where the suffix starts, -1 if netloc has no known suffix,
+        or None if netloc is an IP address.
+        """
+        bytes_trie = self._bytes_trie
+        if bytes_trie is None or bytes_trie[0] is not self._compiled_trie:
+            self._ensure_trie()
+            compiled = self._compiled_trie
+            # Paired with the trie it was made from, so that it is remade after reload()
+            bytes_trie = self._bytes_trie = (compiled, self._trie_encode(compiled))
+
+        if netloc[:1] in IP_FIRST_BYTES and looks_like_ip(netloc.decode("utf-8", "surrogateescape")):
+            return None
+
+        labels = netloc.split(b".")
+        labels.reverse()
+
+        children, wildcard, exceptions = bytes_trie[1]
+        netloc_end = suffix_start = len(netloc) + 1
+        for label in labels:
+            if children is None:
                 break
+            child = children.get(label)
+            if child is not None:
+                suffix_start -= len(label) + 1
+                children, wildcard, exceptions = child
+                continue
+            if wildcard and label not in exceptions:
+                suffix_start -= len(label) + 1
+            break
+        return -1 if suffix_start == netloc_end else suffix_start
+
+    def _find_suffix_bytes_compact(self, netloc):
+        """_find_suffix_bytes() for engine="compact", where self._compact_trie is keyed by UTF-8 already."""
+        if self._compact_trie is None:
+            self._ensure_trie()
+        if netloc[:1] in IP_FIRST_BYTES and looks_like_ip(netloc.decode("utf-8", "surrogateescape")):
+            return None
+        return self._compact_trie.find_suffix(netloc)
+
+    def _find_suffix_bytes_decoded(self, netloc):
+        """
+        _find_suffix_bytes() with cache_size or stats=True: look up the decoded host with _lookup(),
+        which caches or counts hosts as str.
+        """
+        host = netloc.decode("utf-8", "surrogateescape")
+        result = self._lookup(host, False)
+        if result is None:
+            return None
+        suffix = result[2]
+        if not suffix:
+            return -1
+        if len(host) == len(netloc):
+            return len(netloc) - len(suffix)
+        return len(netloc) - len(suffix.encode("utf-8", "surrogateescape"))
+
+    def extract_many(self, raw_urls, subdomain=True, format=False):
+        """
+        Extract suffix and subdomain from many URLs at once.
+        Same as extract() on each URL, with its work inlined in one loop: no method call or keyword argument
+        handling per URL, and the regex, host lookup and result type are looked up once.
+        :param raw_urls: An iterable of URL strings.
+        :param subdomain: Output options. See extract().
+        :param format: To format raw_url strings.
+        :return: List of TLDResult, in input order.
+        >>> FastTLDExtract.extract_many(['www.google.com.hk', '127.0.0.1'])
+        >>> [TLDResult(scheme='', userinfo='', subdomain='www', domain='google', suffix='com.hk', port='', path='', domain_name='google.com.hk'),
+        >>>  TLDResult(scheme='', userinfo='', subdomain='', domain='127.0.0.1', suffix='', port='', path='', domain_name='127.0.0.1')]
+        """
+        return self._extract_list(raw_urls, subdomain, format)
+
+    def extract_many_dedup(self, raw_urls, subdomain=True, format=False):
+        """
+        Extract many URLs with few distinct hosts, eg. a day of DNS query logs.
+        Each URL is split into scheme, userinfo, host, port and path as by extract_many(), but the trie walk
+        runs once per distinct host, and its result is shared by all rows with that host.
+        Hosts are compared after what extract() strips, and after format() normalizes them if format is True.
+        Only the distinct hosts and their results are kept, not the URLs.
+        :param raw_urls: An iterable of URL strings.
+        :param subdomain: Output options. See extract().
+        :param format: To format raw_url strings.
+        :return: Tuple(list of TLDResult in input order, NamedTuple(rows, unique, ratio)).
+        unique is the number of distinct hosts, and ratio is rows per distinct host, ie. how many times fewer
+        trie walks were needed than rows.
+        >>> FastTLDExtract.extract_many_dedup(['www.google.com.hk', 'https://www.google.com.hk/a', 'www.google.com.hk:8080'])
+        >>> ([TLDResult(scheme='', userinfo='', subdomain='www', domain='google', suffix='com.hk', port='', path='', domain_name='google.com.hk'), ...],
+        >>>  DedupInfo(rows=3, unique=1, ratio=3.0))
+        """
+        hosts = {}
+        results = self._extract_list(raw_urls, subdomain, format, hosts)
+        rows = len(results)
+        unique = len(hosts)
+        return results, DedupInfo(rows, unique, float(rows) / unique if unique else 1.0)
 
-            # check a TLD in PSL
-            if label in node:
-                suffix.append(label)
-                node = node[label]
+    def _extract_list(self, raw_urls, subdomain, format, hosts=None):
+        """
+        extract() of each URL, inlined in one loop, see extract_many().
+        :param hosts: Dict(host -> lookup result) to look up each distinct host once, see extract_many_dedup().
+        :return: List of TLDResult, in input order.
+        """
+        url_match = URL_RE.match
+        lookup = self._lookup
+        format_url = self._format
+        # TLDResult(...) without the Python-level __new__ of namedtuple, as TLDResult._make() does
+        new_result = tuple.__new__
+        results = []
+        append = results.append
+        for raw_url in raw_urls:
+            if format:
+                raw_url = format_url(raw_url)
+            ret_scheme, ret_userinfo, netloc, after_host = url_match(raw_url.strip(". \n\t\r\uFEFF")).groups("")
+
+            # Port and path, see extract()
+            ret_port = ret_path = ""
+            if after_host:
+                path_start_index = after_host.find("/")
+                if after_host[0] == ':':
+                    if path_start_index == -1:
+                        maybe_port = after_host[1:]
+                    else:
+                        maybe_port = after_host[1:path_start_index]
+                    if (maybe_port.isdecimal() or check_numeric(maybe_port)) and 0 <= int(maybe_port) <= 65535:
+                        ret_port = maybe_port
+                        if path_start_index != -1:
+                            ret_path = after_host[path_start_index+1:]
+                elif path_start_index != -1:
+                    ret_path = after_host[path_start_index+1:]
+
+            if hosts is None:
+                host = lookup(netloc, subdomain)
             else:
-                break
+                host = hosts.get(netloc, _MISSING)
+                if host is _MISSING:
+                    host = hosts[netloc] = lookup(netloc, subdomain)
+            if host is None:
+                # raw_url is an IP address
+                append(new_result(TLDResult, ("", "", "", netloc, "", "", "", netloc)))
+            else:
+                ret_subdomain, ret_domain, ret_suffix, ret_domain_name = host
+                append(new_result(TLDResult, (ret_scheme, ret_userinfo, ret_subdomain, ret_domain, ret_suffix,
+                                              ret_port, ret_path, ret_domain_name)))
+        return results
 
-        suffix.reverse()
-        len_suffix = len(suffix)
-        len_labels = len(labels)
-        ret_suffix = ".".join(suffix)
+    def _extract_url_host(self, raw_url, subdomain, format):
+        """extract() of the host fields only. :return: Tuple(subdomain, domain, suffix, domain_name)"""
+        if format:
+            raw_url = self._format(raw_url)
+        netloc = URL_RE.match(raw_url.strip(". \n\t\r\uFEFF")).group(3)
+        host = self._lookup(netloc, subdomain)
+        # raw_url is an IP address
+        if host is None:
+            return "", netloc, "", netloc
+        return host
 
-        if 0 < len_suffix < len_labels:
-            ret_domain = labels[len_suffix]
-            if subdomain:
-                if len_suffix + 1 < len_labels:
-                    ret_subdomain = netloc[: -(len(ret_domain) + len(ret_suffix) + 2)]
-        if ret_domain and ret_suffix:
-            ret_domain_name = "%s.%s" % (ret_domain, ret_suffix)
+    def extract_columns(self, raw_urls, fields=None, subdomain=True, format=False, array_type="list"):
+        """
+        Extract many URLs into one column per field, instead of one TLDResult per URL.
+        Only the requested fields are kept. If they are all host fields (subdomain, domain, suffix, domain_name),
+        only the host of each URL is extracted: scheme, userinfo, port and path are not split off, and no
+        TLDResult is built.
+        :param raw_urls: An iterable of URL strings.
+        :param fields: Names of the TLDResult fields to return. Defaults to all fields.
+        :param subdomain: Output options. See extract().
+        :param format: To format raw_url strings.
+        :param array_type: "list" for lists, "numpy" for NumPy object arrays, or "pandas" for a DataFrame.
+        NumPy and pandas are only imported if requested.
+        :return: Dict(field -> column) in the order of fields, or a pandas DataFrame.
+        >>> FastTLDExtract.extract_columns(['www.google.com.hk', '127.0.0.1'], fields=['domain_name'])
+        >>> {'domain_name': ['google.com.hk', '127.0.0.1']}
+        """
+        fields = list(TLDResult._fields if fields is None else fields)
+        for field in fields:
+            if field not in TLDResult._fields:
+                raise ValueError("Unknown field %r. Valid fields: %s" % (field, ", ".join(TLDResult._fields)))
+        if array_type not in ("list", "numpy", "pandas"):
+            raise ValueError("Unknown array_type %r. Valid array types: list, numpy, pandas" % (array_type,))
 
-        return TLDResult(
-            ret_scheme,
-            ret_userinfo,
-            ret_subdomain,
-            ret_domain,
-            ret_suffix,
-            ret_port,
-            ret_path,
-            ret_domain_name,
-        )
+        if all(field in HostResult._fields for field in fields):
+            extract, result_fields = self._extract_url_host, HostResult._fields
+        else:
+            extract, result_fields = self.extract, TLDResult._fields
+        if len(fields) == 1:
+            index = result_fields.index(fields[0])
+            columns = [[extract(raw_url, subdomain, format)[index] for raw_url in raw_urls]]
+        else:
+            columns = [[] for _ in fields]
+            appenders = [(column.append, result_fields.index(field)) for column, field in zip(columns, fields)]
+            for raw_url in raw_urls:
+                result = extract(raw_url, subdomain, format)
+                for append, index in appenders:
+                    append(result[index])
+
+        if array_type == "numpy":
+            import numpy
+            columns = [numpy.array(column, dtype=object) for column in columns]
+        elif array_type == "pandas":
+            import pandas
+            return pandas.DataFrame(dict(zip(fields, columns)), columns=fields)
+        return dict(zip(fields, columns))
 
     def format(self, raw_url):
         """
         Now we provide simple rules to format strings.
-        eg. lower case, punycode transform
-        Todo:
-        1.URL Parser to extract domain.
-        2.idna domain parser
+        eg. lower case, punycode transform of the host
         :param raw_url:
         :return: input
+        >>> FastTLDExtract.format('https://WWW.食狮.com.cn/路径')
+        >>> 'https://www.xn--85x722f.com.cn/路径'
         """
-        # idna_url = idna.encode(raw_url.strip().lower()).decode()
-        # input_ = urlparse.urlparse(idna_url).netloc
-        # if '//' in input_:
-        #     _, _, input_ = input_.rpartition('//')
-        # if '/' in input_:
-        #     input_, _, _ = input_.lpartition('//')
-        # return input_
         # Punycode costs too much time! Make sure you really need it.
+        # Only non-ASCII labels of the host are encoded, and their encodings are cached.
+        url = raw_url.strip().lower()
+        if url.isascii():
+            return url
+
+        match = URL_RE.match(url)
+        host_start = match.start(3)
+        host_end = match.end(3)
 
-        return idna.encode(raw_url.strip().lower()).decode()
+        host = url[host_start:host_end]
+        if host.isascii():
+            return url
+        host = ".".join(
+            label if label.isascii() else idna_label(label) for label in IDNA_DOTS_RE.sub(".", host).split(".")
+        )
+        return url[:host_start] + host + url[host_end:]
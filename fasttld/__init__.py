@@ -10,4 +10,6 @@ Copyright (c) 2017-2018 Jophy
 """
 
 from fasttld.FastTLDExtract import FastTLDExtract
-from fasttld.psl import update
+from fasttld.parallel import extract_parallel
+from fasttld.psl import auto_update, update
+from fasttld.shared import SharedFastTLDExtract
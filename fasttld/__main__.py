@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@author: Jophy and Wu Tingfeng
+@file: __main__.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+import sys
+
+from fasttld.cli import main
+
+sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+asyncio helpers, for extracting URLs from event-loop services without blocking the loop.
+@author: Jophy and Wu Tingfeng
+@file: aio.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+import asyncio
+from itertools import islice
+
+# Number of URLs extracted per executor call
+DEFAULT_CHUNK_SIZE = 1000
+
+
+async def _async_chunks(raw_urls, chunk_size):
+    """Group an iterable or async iterable of URLs into lists of up to chunk_size URLs."""
+    if not hasattr(raw_urls, "__aiter__"):
+        raw_urls = iter(raw_urls)
+        while True:
+            chunk = list(islice(raw_urls, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+    chunk = []
+    async for raw_url in raw_urls:
+        chunk.append(raw_url)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def extract_stream(extractor, raw_urls, chunk_size=DEFAULT_CHUNK_SIZE, subdomain=True, format=False,
+                         executor=None):
+    """
+    Asynchronously iterate over the results of a stream of URLs.
+    URLs are extracted in chunks of chunk_size with extractor.extract_many() on an executor,
+    so the event loop keeps running other tasks while a chunk is extracted.
+    A chunk is extracted once chunk_size URLs have arrived, or when the stream ends.
+    :param extractor: FastTLDExtract instance.
+    :param raw_urls: An async iterable of URL strings, eg. an async generator reading a socket.
+    Plain iterables are accepted too.
+    :param chunk_size: Number of URLs extracted per executor call.
+    :param subdomain: Output options. See FastTLDExtract.extract().
+    :param format: To format raw_url strings.
+    :param executor: concurrent.futures.Executor to run chunks on. Defaults to the default executor of the loop.
+    :return: Async iterator of TLDResult, in input order.
+    >>> async for result in extract_stream(FastTLDExtract(), url_stream):
+    >>>     print(result.domain_name)
+    """
+    loop = asyncio.get_running_loop()
+    async for chunk in _async_chunks(raw_urls, chunk_size):
+        results = await loop.run_in_executor(executor, extractor.extract_many, chunk, subdomain, format)
+        for result in results:
+            yield result
+
+
+async def extract_many_async(extractor, raw_urls, chunk_size=DEFAULT_CHUNK_SIZE, subdomain=True, format=False,
+                             executor=None):
+    """
+    Extract many URLs without blocking the event loop, see extract_stream().
+    :param extractor: FastTLDExtract instance.
+    :param raw_urls: An iterable or async iterable of URL strings.
+    :param chunk_size: Number of URLs extracted per executor call.
+    :param subdomain: Output options. See FastTLDExtract.extract().
+    :param format: To format raw_url strings.
+    :param executor: concurrent.futures.Executor to run chunks on. Defaults to the default executor of the loop.
+    :return: List of TLDResult, in input order.
+    >>> await extract_many_async(FastTLDExtract(), ['www.google.com.hk', '127.0.0.1'])
+    >>> [TLDResult(scheme='', userinfo='', subdomain='www', domain='google', suffix='com.hk', port='', path='', domain_name='google.com.hk'),
+    >>>  TLDResult(scheme='', userinfo='', subdomain='', domain='127.0.0.1', suffix='', port='', path='', domain_name='127.0.0.1')]
+    """
+    results = []
+    async for result in extract_stream(extractor, raw_urls, chunk_size, subdomain, format, executor):
+        results.append(result)
+    return results
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Command line interface, run as `python -m fasttld` or `fasttld`.
+@author: Jophy and Wu Tingfeng
+@file: cli.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from itertools import islice
+
+from fasttld.FastTLDExtract import FastTLDExtract, TLDResult
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Output is written in blocks of this many bytes
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def open_input(path):
+    """
+    Open a file, or stdin if path is '-', for reading text lines.
+    gzip-compressed input is detected and decompressed on the fly.
+    """
+    if path == "-":
+        raw = sys.stdin.buffer
+    else:
+        raw = open(path, "rb")
+    if not hasattr(raw, "peek"):
+        raw = io.BufferedReader(raw)
+    if raw.peek(2)[:2] == GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw, mode="rb")
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+
+
+def read_urls(paths):
+    """Yield lines from each of the input files in turn."""
+    for path in paths:
+        fd = open_input(path)
+        try:
+            for line in fd:
+                yield line
+        finally:
+            if path != "-":
+                fd.close()
+
+
+# Linear TSV escapes, so that fields with tabs or line breaks do not shift columns or rows
+TSV_ESCAPES = {ord("\\"): "\\\\", ord("\t"): "\\t", ord("\n"): "\\n", ord("\r"): "\\r"}
+
+
+def batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def format_tsv(rows, fields):
+    text = "".join("\t".join(row) + "\n" for row in rows)
+    # Fields rarely contain characters to escape, so check the whole chunk first
+    if ("\\" not in text and "\r" not in text and text.count("\n") == len(rows)
+            and text.count("\t") == len(rows) * (len(fields) - 1)):
+        return text
+    return "".join("\t".join(field.translate(TSV_ESCAPES) for field in row) + "\n" for row in rows)
+
+
+def format_csv(rows, fields):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue()
+
+
+def format_jsonl(rows, fields):
+    dumps = json.dumps
+    return "".join(dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+FORMATTERS = {
+    "tsv": format_tsv,
+    "csv": format_csv,
+    "jsonl": format_jsonl,
+}
+
+
+def run(extractor, urls, out, fields, output_format="tsv", batch_size=10000, subdomain=True, format=False,
+        header=False):
+    """
+    Extract URLs in batches and write one output row per URL.
+    Memory use is bounded by batch_size, regardless of the input size.
+    :param extractor: FastTLDExtract instance.
+    :param urls: An iterable of URL strings.
+    :param out: Text file object to write to.
+    :param fields: Names of the TLDResult fields to output.
+    :return: Number of rows written.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive, got %r" % batch_size)
+    formatter = FORMATTERS[output_format]
+    indexes = [TLDResult._fields.index(field) for field in fields]
+    if header and output_format != "jsonl":
+        out.write(formatter([fields], fields))
+
+    count = 0
+    pending = []
+    pending_size = 0
+    for batch in batches(urls, batch_size):
+        results = extractor.extract_many(batch, subdomain, format)
+        chunk = formatter([[result[i] for i in indexes] for result in results], fields)
+        count += len(results)
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= WRITE_BUFFER_SIZE:
+            out.write("".join(pending))
+            pending = []
+            pending_size = 0
+    if pending:
+        out.write("".join(pending))
+    return count
+
+
+def parse_fields(value):
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    for field in fields:
+        if field not in TLDResult._fields:
+            raise argparse.ArgumentTypeError(
+                "unknown field %r, choose from %s" % (field, ", ".join(TLDResult._fields))
+            )
+    return fields
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be a positive integer, got %r" % value)
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="fasttld",
+        description="Extract scheme, subdomain, domain, suffix, port and path from URLs, one URL per line.",
+    )
+    parser.add_argument("inputs", nargs="*", default=["-"], metavar="FILE",
+                        help="input files, optionally gzip-compressed. '-' or none reads stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, '-' for stdout (default)")
+    parser.add_argument("-t", "--output-format", choices=sorted(FORMATTERS), default="tsv",
+                        help="output format (default: tsv). tsv escapes backslashes, tabs and line breaks "
+                             "in fields as \\\\, \\t, \\n and \\r")
+    parser.add_argument("-f", "--fields", type=parse_fields, default=list(TLDResult._fields),
+                        help="comma-separated fields to output (default: all of %s)"
+                             % ",".join(TLDResult._fields))
+    parser.add_argument("--header", action="store_true", help="write a header row (tsv and csv)")
+    parser.add_argument("--exclude-private-suffix", action="store_true",
+                        help="treat private domains like blogspot.co.uk as regular domains")
+    parser.add_argument("--file-path", default="", help="public suffix list file to use")
+    parser.add_argument("--no-subdomain", action="store_true", help="do not extract subdomains")
+    parser.add_argument("--idna", action="store_true", help="lower-case and punycode-encode URLs first")
+    parser.add_argument("--batch-size", type=positive_int, default=10000, help="URLs extracted per batch")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    extractor = FastTLDExtract(exclude_private_suffix=args.exclude_private_suffix, file_path=args.file_path)
+    out = sys.stdout
+    try:
+        if args.output != "-":
+            out = io.open(args.output, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER_SIZE)
+        run(extractor, read_urls(args.inputs), out, args.fields, args.output_format, args.batch_size,
+            not args.no_subdomain, args.idna, args.header)
+        out.flush()
+    except BrokenPipeError:
+        # eg. piped into `head`. Keep the interpreter from failing again when it flushes stdout on exit
+        if out is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except OSError as e:
+        # eg. a missing or unreadable input file. Exits with status 2
+        parser.error(str(e))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
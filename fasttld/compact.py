@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compact trie engine, see FastTLDExtract(engine="compact").
+@author: Jophy and Wu Tingfeng
+@file: compact.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+import mmap
+import struct
+import sys
+
+# Node flags
+LEAF = 1  # node is True in the dict trie, it has no sub-nodes
+END = 2  # "_END" in node, it is a suffix with sub-nodes
+WILDCARD = 4  # "*" in node
+
+MAGIC = b"FTLDCT01"
+# magic, byte order, padding, number of nodes, digest of the public suffix list file (see psl.getFileDigest())
+HEADER = struct.Struct("<8s1s3xI40s")
+
+
+def _trie_nodes(trie, parent_key=None):
+    """
+    Yield (key, flags) for every node of a dict trie built by FastTLDExtract._trie_construct().
+    Keys are suffixes in normal order, eg. "co.uk" for trie["uk"]["co"].
+    """
+    for label, node in trie.items():
+        if label == "_END":
+            continue
+        key = label if parent_key is None else "%s.%s" % (label, parent_key)
+        if node is True:
+            yield key, LEAF
+            continue
+        flags = 0
+        if "_END" in node:
+            flags |= END
+        if "*" in node:
+            flags |= WILDCARD
+        yield key, flags
+        for item in _trie_nodes(node, key):
+            yield item
+
+
+def pack_trie(trie, digest=""):
+    """
+    Pack a dict trie into a single buffer that CompactTrie can read.
+    :param digest: Digest of the public suffix list file the trie was built from, stored in the header.
+    Layout: header, offsets of the keys (uint32, one more than the number of nodes), flags (one byte per node),
+    then all keys UTF-8 encoded and sorted, back to back.
+    :return: bytes
+    """
+    nodes = sorted((key.encode("utf-8"), flags) for key, flags in _trie_nodes(trie))
+    count = len(nodes)
+    blob_start = HEADER.size + (count + 1) * 4 + count
+    offsets = [blob_start]
+    for key, _ in nodes:
+        offsets.append(offsets[-1] + len(key))
+    return b"".join([
+        HEADER.pack(MAGIC, sys.byteorder[0].encode(), count, digest.encode("ascii")),
+        struct.pack("=%dI" % (count + 1), *offsets),
+        bytes(bytearray(flags for _, flags in nodes)),
+    ] + [key for key, _ in nodes])
+
+
+class CompactTrie(object):
+    """
+    Read-only trie of suffixes stored in one flat buffer, as written by pack_trie().
+    Nodes are found by binary search over the sorted keys instead of by nested dict lookups.
+    This takes a fraction of the memory of the dict trie, at the cost of slower lookups.
+    The buffer can be any object supporting the buffer protocol and slicing to bytes, eg. bytes or mmap.
+    """
+
+    def __init__(self, buf):
+        if len(buf) < HEADER.size:
+            raise ValueError("Not a compact trie buffer")
+        magic, byteorder, count, digest = HEADER.unpack_from(buf)
+        if magic != MAGIC or byteorder != sys.byteorder[0].encode():
+            raise ValueError("Not a compact trie buffer of this platform")
+        offsets_end = HEADER.size + (count + 1) * 4
+        if len(buf) < offsets_end + count:
+            raise ValueError("Truncated compact trie buffer")
+        self._buf = buf
+        self._count = count
+        self.digest = digest.rstrip(b"\0").decode("ascii")
+        self._offsets = memoryview(buf)[HEADER.size:offsets_end].cast("I")
+        self._flags = memoryview(buf)[offsets_end:offsets_end + count]
+
+    @classmethod
+    def from_trie(cls, trie, digest=""):
+        return cls(pack_trie(trie, digest))
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Memory-map a file written from pack_trie() read-only.
+        All processes mapping the same file share one copy of it in physical memory.
+        The file must be replaced by renaming (see psl.saveCompactTrie()), never modified in place,
+        or processes mapping it may crash.
+        """
+        with open(path, "rb") as fd:
+            buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(buf)
+        except Exception:
+            buf.close()
+            raise
+
+    def __len__(self):
+        return self._count
+
+    def memory_usage(self):
+        """:return: Size of the buffer in bytes"""
+        return len(self._buf) + sys.getsizeof(self)
+
+    def find(self, key):
+        """
+        :param key: UTF-8 encoded suffix in normal order, eg. b"co.uk"
+        :return: Node flags, or -1 if there is no such node.
+        """
+        buf = self._buf
+        offsets = self._offsets
+        lo = 0
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = buf[offsets[mid]:offsets[mid + 1]]
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key == key:
+                return self._flags[mid]
+            else:
+                hi = mid
+        return -1
+
+    def find_suffix(self, netloc):
+        """
+        Walk the trie along the labels of a UTF-8 encoded host, from the right.
+        :param netloc: UTF-8 encoded host name, eg. b"www.google.co.uk"
+        :return: Offset in netloc where the suffix starts, or -1 if netloc has no known suffix.
+        """
+        find = self.find
+        flags = 0  # the root node
+        suffix_start = -1  # netloc[suffix_start:] is the suffix
+        label_end = len(netloc)
+        while label_end != -1:
+            if flags & LEAF:
+                break
+            dot = netloc.rfind(b".", 0, label_end)
+            label_end = dot
+            # Keys are suffixes in normal order, so the node key is just the rest of netloc
+            child = netloc[dot+1:]
+            # Sub-nodes of a node with "_END" take precedence over its wildcard, eg. gov.cn
+            child_flags = find(child) if flags & END or not flags & WILDCARD else -1
+            if child_flags == -1:
+                # eg. www.ck is an exception to *.ck
+                if flags & WILDCARD and find(b"!" + child) == -1:
+                    suffix_start = dot + 1
+                break
+            suffix_start = dot + 1
+            flags = child_flags
+        return suffix_start
+
+    def lookup(self, netloc, subdomain):
+        """
+        Split a host into subdomain, domain, suffix and domain name.
+        Same result as FastTLDExtract._lookup_host() on the dict trie, except that IP addresses are not detected.
+        :return: Tuple(subdomain, domain, suffix, domain_name)
+        """
+        ret_subdomain = ret_domain = ret_suffix = ret_domain_name = ""
+
+        # surrogateescape round-trips hosts decoded from invalid UTF-8, see FastTLDExtract.extract_bytes()
+        encoded = netloc.encode("utf-8", "surrogateescape")
+        suffix_start = self.find_suffix(encoded)
+        if suffix_start > 0 and len(encoded) != len(netloc):
+            # From an offset in bytes to one in characters
+            suffix_start = len(netloc) - len(encoded[suffix_start:].decode("utf-8", "surrogateescape"))
+
+        if suffix_start != -1:
+            ret_suffix = netloc[suffix_start:]
+            if suffix_start != 0:
+                domain_end = suffix_start - 1
+                domain_start = netloc.rfind(".", 0, domain_end) + 1
+                ret_domain = netloc[domain_start:domain_end]
+                if subdomain and domain_start != 0:
+                    ret_subdomain = netloc[:domain_start - 1]
+                if ret_domain:
+                    ret_domain_name = netloc[domain_start:]
+
+        return ret_subdomain, ret_domain, ret_suffix, ret_domain_name
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pandas and Apache Arrow integration. Requires pandas or pyarrow, eg. `pip install fasttld[pandas,arrow]`.
+@author: Jophy and Wu Tingfeng
+@file: dataframe.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+from fasttld.FastTLDExtract import FastTLDExtract, TLDResult
+
+# Number of rows of an Arrow array extracted at a time
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def _check_fields(fields):
+    if fields is None:
+        return list(TLDResult._fields)
+    for field in fields:
+        if field not in TLDResult._fields:
+            raise ValueError("Unknown field %r. Valid fields: %s" % (field, ", ".join(TLDResult._fields)))
+    return list(fields)
+
+
+def extract_series(series, extractor=None, fields=None, subdomain=True, format=False):
+    """
+    Extract a pandas Series of URL strings into a DataFrame with one column per field.
+    Each distinct URL is extracted once (see pandas.factorize()), and the results are spread over the rows
+    by NumPy indexing, so no Python object is created per row.
+    :param series: pandas Series of URL strings. Missing values give missing values in all fields.
+    :param extractor: FastTLDExtract instance. Defaults to a new FastTLDExtract().
+    :param fields: Names of the TLDResult fields to return. Defaults to all fields.
+    :param subdomain: Output options. See FastTLDExtract.extract().
+    :param format: To format URL strings.
+    :return: pandas DataFrame with the index of series.
+    >>> extract_series(pandas.Series(['www.google.com.hk', '127.0.0.1']), fields=['domain', 'suffix'])
+    >>>       domain  suffix
+    >>> 0     google  com.hk
+    >>> 1  127.0.0.1
+    """
+    import numpy
+    import pandas
+
+    fields = _check_fields(fields)
+    if extractor is None:
+        extractor = FastTLDExtract()
+    codes, uniques = pandas.factorize(series)
+    columns = extractor.extract_columns(list(uniques), fields, subdomain, format)
+    data = {}
+    for field in fields:
+        # Missing values have code -1, which picks the trailing None
+        values = numpy.empty(len(uniques) + 1, dtype=object)
+        values[:-1] = columns[field]
+        data[field] = values[codes]
+    return pandas.DataFrame(data, index=series.index, columns=fields)
+
+
+def extract_arrow(array, extractor=None, fields=None, subdomain=True, format=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Extract a pyarrow string array into a RecordBatch with one string column per field.
+    The array is processed chunk_size rows at a time, without copying.
+    In each chunk, each distinct URL is extracted once (see pyarrow.Array.dictionary_encode()),
+    and the results are spread over the rows by pyarrow take(), so no Python object is created per row.
+    :param array: pyarrow Array or ChunkedArray of strings. Nulls give nulls in all fields.
+    :param extractor: FastTLDExtract instance. Defaults to a new FastTLDExtract().
+    :param fields: Names of the TLDResult fields to return. Defaults to all fields.
+    :param subdomain: Output options. See FastTLDExtract.extract().
+    :param format: To format URL strings.
+    :param chunk_size: Number of rows extracted at a time.
+    :return: pyarrow RecordBatch
+    >>> extract_arrow(pyarrow.array(['www.google.com.hk', '127.0.0.1']), fields=['domain_name']).to_pydict()
+    >>> {'domain_name': ['google.com.hk', '127.0.0.1']}
+    """
+    import pyarrow
+
+    fields = _check_fields(fields)
+    if extractor is None:
+        extractor = FastTLDExtract()
+    chunks = array.chunks if isinstance(array, pyarrow.ChunkedArray) else [array]
+    pieces = dict((field, []) for field in fields)
+    for chunk in chunks:
+        for offset in range(0, len(chunk), chunk_size):
+            encoded = chunk.slice(offset, chunk_size).dictionary_encode()
+            columns = extractor.extract_columns(encoded.dictionary.to_pylist(), fields, subdomain, format)
+            for field in fields:
+                pieces[field].append(pyarrow.array(columns[field], type=pyarrow.string()).take(encoded.indices))
+    arrays = [
+        pyarrow.concat_arrays(pieces[field]) if pieces[field] else pyarrow.array([], type=pyarrow.string())
+        for field in fields
+    ]
+    return pyarrow.RecordBatch.from_arrays(arrays, names=fields)
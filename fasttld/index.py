@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Query index of the suffixes of a trie, see FastTLDExtract.suffix_index().
+@author: Jophy and Wu Tingfeng
+@file: index.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+
+
+class SuffixIndex(object):
+    """
+    Precomputed index of the suffixes of a trie built by FastTLDExtract._trie_construct().
+    Suffixes are in normal order, eg. "co.uk". Matching follows extract(): s is a public suffix exactly
+    if FastTLDExtract.extract_host(s).suffix == s.
+    """
+
+    def __init__(self, trie):
+        self._suffixes = set()  # suffixes reachable by extract(), apart from those of wildcard rules
+        self._wildcards = {}  # suffix with a reachable wildcard rule -> labels excepted from it
+        self._children = {}  # suffix -> sorted tuple of its child suffixes, "" for the top-level domains
+        wildcard_rules = []
+        exception_rules = []
+
+        stack = [("", trie, True)]
+        while stack:
+            key, node, reachable = stack.pop()
+            if node is True:
+                self._children[key] = ()
+                continue
+            wildcard = "*" in node
+            exceptions = frozenset(label[1:] for label in node if label.startswith("!"))
+            if wildcard:
+                wildcard_rules.append("*." + key)
+                if reachable:
+                    self._wildcards[key] = exceptions
+            exception_rules.extend("!%s.%s" % (label, key) for label in exceptions)
+            # extract() skips the sub-nodes of a wildcard node, unless the node is a suffix itself
+            children_reachable = reachable and (not wildcard or "_END" in node)
+            children = []
+            for label, child in node.items():
+                if label == "_END" or label == "*" or label.startswith("!"):
+                    continue
+                child_key = "%s.%s" % (label, key) if key else label
+                children.append(child_key)
+                if children_reachable:
+                    self._suffixes.add(child_key)
+                stack.append((child_key, child, children_reachable))
+            children.sort()
+            self._children[key] = tuple(children)
+
+        self.wildcard_rules = tuple(sorted(wildcard_rules))
+        self.exception_rules = tuple(sorted(exception_rules))
+
+    def __len__(self):
+        """:return: Number of suffixes in the trie, not counting those matched by wildcard rules."""
+        return len(self._children) - 1
+
+    def __contains__(self, suffix):
+        return self.is_public_suffix(suffix)
+
+    def is_public_suffix(self, s):
+        """
+        Is the given str itself a public suffix? Takes one or two set lookups.
+        :param s: Lower case host name, punycode-encoded or not.
+        >>> index.is_public_suffix('co.uk'), index.is_public_suffix('google.co.uk')
+        >>> (True, False)
+        """
+        if s in self._suffixes:
+            return True
+        label, _, parent = s.partition(".")
+        # eg. foo.ck matches *.ck, unless it is an exception like www.ck
+        exceptions = self._wildcards.get(parent)
+        return exceptions is not None and label != "" and label not in exceptions
+
+    def children(self, suffix=""):
+        """
+        :param suffix: A suffix of the trie, or "" for the top-level domains.
+        :return: Sorted tuple of the suffixes one label longer than suffix, empty if there are none.
+        >>> index.children('uk')
+        >>> ('ac.uk', 'co.uk', 'gov.uk', ...)
+        """
+        return self._children.get(suffix, ())
+
+    def iter_suffixes(self, under=""):
+        """
+        Enumerate a suffix and all suffixes ending with it, in depth-first order.
+        :param under: A suffix of the trie, or "" for all suffixes.
+        :return: Iterator of suffix strings
+        >>> list(index.iter_suffixes('uk'))
+        >>> ['uk', 'ac.uk', 'co.uk', 'blogspot.co.uk', ...]
+        """
+        if under not in self._children:
+            return
+        stack = [under]
+        while stack:
+            suffix = stack.pop()
+            if suffix:
+                yield suffix
+            stack.extend(reversed(self._children.get(suffix, ())))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+@author: Jophy and Wu Tingfeng
+@file: parallel.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+from itertools import islice
+
+from fasttld.FastTLDExtract import FastTLDExtract, TLDResult
+
+# The extractor of the current worker process, built once by _init_worker()
+_extractor = None
+
+
+def _init_worker(extractor_kwargs):
+    global _extractor
+    _extractor = FastTLDExtract(**extractor_kwargs)
+
+
+def _extract_columns(extractor, raw_urls, fields, subdomain, format):
+    """
+    Extract a chunk of URLs with the given extractor.
+    Results are returned as one list per field, which pickles much smaller than a list of TLDResult.
+    """
+    columns = extractor.extract_columns(raw_urls, fields, subdomain, format)
+    return [columns[field] for field in fields]
+
+
+def _extract_chunk(args):
+    """Extract a chunk of URLs in a worker process, with the extractor built by _init_worker()."""
+    return _extract_columns(_extractor, *args)
+
+
+def _chunks(raw_urls, chunk_size):
+    raw_urls = iter(raw_urls)
+    while True:
+        chunk = list(islice(raw_urls, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def extract_parallel(raw_urls, processes=None, chunk_size=10000, subdomain=True, format=False,
+                     columnar=True, fields=None, **extractor_kwargs):
+    """
+    Extract many URLs on all CPU cores with a process pool.
+    Each worker process builds its FastTLDExtract once (from the trie snapshot, see FastTLDExtract.__init__),
+    and URLs are sent to the workers in chunks of chunk_size.
+    :param raw_urls: An iterable of URL strings.
+    :param processes: Number of worker processes. Defaults to the number of CPUs.
+    If 1, URLs are extracted in the current process.
+    :param chunk_size: Number of URLs sent to a worker at a time.
+    :param subdomain: Output options. See FastTLDExtract.extract().
+    :param format: To format raw_url strings.
+    :param columnar: Return a dict of per-field lists instead of a list of TLDResult.
+    :param fields: Names of the fields to return if columnar. Defaults to all fields.
+    :param extractor_kwargs: Passed on to FastTLDExtract(), eg. exclude_private_suffix=True
+    :return: Dict(field -> list) if columnar, else list of TLDResult, in input order.
+    >>> extract_parallel(['www.google.com.hk', '127.0.0.1'])
+    >>> {'scheme': ['', ''], 'userinfo': ['', ''], 'subdomain': ['www', ''], 'domain': ['google', '127.0.0.1'],
+    >>>  'suffix': ['com.hk', ''], 'port': ['', ''], 'path': ['', ''], 'domain_name': ['google.com.hk', '127.0.0.1']}
+    """
+    if fields is None:
+        fields = TLDResult._fields
+    elif not columnar:
+        raise ValueError("fields can only be selected if columnar is True")
+    tasks = ((chunk, fields, subdomain, format) for chunk in _chunks(raw_urls, chunk_size))
+    if processes == 1:
+        # A local extractor, leaving the worker state of this module alone
+        extractor = FastTLDExtract(**extractor_kwargs)
+        chunk_results = (_extract_columns(extractor, *task) for task in tasks)
+        pool = None
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes, _init_worker, (extractor_kwargs,))
+        chunk_results = pool.imap(_extract_chunk, tasks)
+
+    columns = [[] for _ in fields]
+    try:
+        for chunk_columns in chunk_results:
+            for column, chunk_column in zip(columns, chunk_columns):
+                column.extend(chunk_column)
+    finally:
+        if pool is not None:
+            # Either all chunks have been received, or an error is propagating
+            pool.terminate()
+            pool.join()
+
+    if columnar:
+        return dict(zip(fields, columns))
+    return [TLDResult._make(row) for row in zip(*columns)]
@@ -8,10 +8,18 @@
 Copyright (c) 2022 Wu Tingfeng
 Copyright (c) 2017-2018 Jophy
 """
+import marshal
 import os
 import os.path
+import sys
+import threading
 import time
 
+# Bump whenever the layout of the trie built by FastTLDExtract._trie_construct changes
+SNAPSHOT_VERSION = 2
+
+PSL_FILE_PATH = os.path.dirname(os.path.realpath(__file__)) + '/public_suffix_list.dat'
+
 
 def getPublicSuffixList(file_path):
     """
@@ -26,7 +34,7 @@ def getPublicSuffixList(file_path):
     AllSuffixList = list()
     pri_flag = False
     if not file_path:
-        file_path = os.path.dirname(os.path.realpath(__file__)) + '/public_suffix_list.dat'
+        file_path = PSL_FILE_PATH
 
     if not os.path.isfile(file_path):
         raise Exception("\rPath:" + file_path + " .\nPublic suffix list file not found.")
@@ -64,47 +72,189 @@ def getPublicSuffixList(file_path):
     return PublicSuffixList, PrivateSuffixList, AllSuffixList
 
 
+def getFileDigest(file_path):
+    """
+    Get the SHA-1 digest of a public suffix list file.
+    :param file_path: Path to the public suffix list file.
+    :return: Hex digest string
+    """
+    import hashlib
+    with open(file_path, 'rb') as fd:
+        return hashlib.sha1(fd.read()).hexdigest()
+
+
+def getSnapshotPath(file_path, exclude_private_suffix, extension="trie"):
+    """
+    Get the path of the trie snapshot belonging to a public suffix list file.
+    Snapshots are stored next to the file, or in FASTTLD_CACHE_DIR if that environment variable is set.
+    :param extension: "trie" for snapshots of the dict trie, "ctrie" for compact tries (see loadCompactTrie()).
+    :return: Path string
+    """
+    name = "%s.%s.%s" % (os.path.basename(file_path), "public" if exclude_private_suffix else "all", extension)
+    cache_dir = os.environ.get("FASTTLD_CACHE_DIR")
+    if cache_dir:
+        # Keep snapshots of different files with the same name apart
+        import hashlib
+        path_digest = hashlib.sha1(os.path.realpath(file_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(cache_dir, "%s.%s" % (path_digest, name))
+    return file_path + name[len(os.path.basename(file_path)):]
+
+
+def _snapshot_header(digest):
+    return ("fasttld-trie %d %d.%d %s\n" % ((SNAPSHOT_VERSION,) + tuple(sys.version_info[:2]) + (digest,))).encode()
+
+
+def loadTrieSnapshot(file_path, exclude_private_suffix, digest):
+    """
+    Load a trie snapshot written by saveTrieSnapshot().
+    :param digest: Digest of the current public suffix list file, see getFileDigest().
+    :return: Tuple(trie dict, compiled trie), or None if the snapshot is missing, stale or unreadable.
+    """
+    try:
+        with open(getSnapshotPath(file_path, exclude_private_suffix), 'rb') as fd:
+            if fd.readline() != _snapshot_header(digest):
+                return None
+            trie = marshal.loads(fd.read())
+    except Exception:
+        return None
+    if isinstance(trie, tuple) and len(trie) == 2 and isinstance(trie[0], dict) and isinstance(trie[1], tuple):
+        return trie
+    return None
+
+
+def saveTrieSnapshot(file_path, exclude_private_suffix, digest, trie):
+    """
+    Save a trie snapshot so that later constructions can skip parsing the public suffix list file.
+    :param trie: Tuple(trie dict, compiled trie), see FastTLDExtract._trie_load().
+    Failures (eg. read-only install directory) are ignored.
+    """
+    def write(f):
+        f.write(_snapshot_header(digest))
+        f.write(marshal.dumps(trie))
+
+    _write_atomic(getSnapshotPath(file_path, exclude_private_suffix), write)
+
+
+def loadCompactTrie(file_path, exclude_private_suffix, digest):
+    """
+    Memory-map the compact trie file written by saveCompactTrie(), see compact.CompactTrie.from_file().
+    :param digest: Digest of the current public suffix list file, see getFileDigest().
+    :return: CompactTrie, or None if the file is missing, stale or unreadable.
+    """
+    from fasttld.compact import CompactTrie
+    try:
+        trie = CompactTrie.from_file(getSnapshotPath(file_path, exclude_private_suffix, "ctrie"))
+    except Exception:
+        return None
+    return trie if trie.digest == digest else None
+
+
+def saveCompactTrie(file_path, exclude_private_suffix, buf):
+    """
+    Save a buffer built by compact.pack_trie() for loadCompactTrie().
+    :return: True if the file was written
+    """
+    return _write_atomic(getSnapshotPath(file_path, exclude_private_suffix, "ctrie"), lambda f: f.write(buf))
+
+
+def _write_atomic(path, write):
+    """
+    Call write() on a temporary file, then rename it to path so readers never see a partial file.
+    Failures (eg. read-only install directory) are ignored.
+    :return: True if the file was written
+    """
+    import tempfile
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=".fasttld-", dir=os.path.dirname(path) or ".")
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        return True
+    except Exception:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+
+
 def update(show_output=True):
     """
     Update Public Suffix List from https://publicsuffix.org/list/public_suffix_list.dat
+    The list is downloaded to a temporary file first and then renamed,
+    so concurrent readers never see a partially written file.
     :return:
     """
+    import tempfile
+    tmp_path = None
     try:
-        file_path = os.path.dirname(os.path.realpath(__file__)) + "/public_suffix_list.dat"
+        file_path = PSL_FILE_PATH
         base_url = 'https://publicsuffix.org/list/public_suffix_list.dat'
-        try:
-            import urllib
-            downfile = urllib.URLopener()
-            downfile.retrieve(base_url, file_path)
-        except Exception:
-            import urllib.request
-            urllib.request.urlretrieve(base_url, file_path)
+        fd, tmp_path = tempfile.mkstemp(prefix=".fasttld-", dir=os.path.dirname(file_path))
+        os.close(fd)
+        import urllib.request
+        urllib.request.urlretrieve(base_url, tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+        tmp_path = None
         if show_output:
             print('Already updated the public suffix list.\nThe file path is:')
             print(file_path)
     except Exception as e:
         raise Exception('[+]PSL UPDATES Error:' + str(e))
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
 
-def auto_update():
+def needs_update(max_age_days=3):
+    """
+    Check if the local copy of the Public Suffix List is missing or older than max_age_days.
+    Does not touch the network.
+    :return: bool
+    """
+    if not os.path.isfile(PSL_FILE_PATH):
+        return True
+    return (time.time() - os.path.getmtime(PSL_FILE_PATH))/3600/24 > max_age_days
+
+
+def auto_update(background=False, callback=None):
     """
     Update Public Suffix List from https://publicsuffix.org/list/public_suffix_list.dat
     This function will update public_suffix_list.dat file every 3 days.
-    :return:
+    It is not called on import; call it explicitly, or construct FastTLDExtract with auto_update=True.
+    :param background: Download in a daemon thread instead of blocking the caller.
+    Errors raised by a background update are ignored, leaving the current file in place.
+    :param callback: Called without arguments after the file has been updated.
+    :return: The background thread if an update was started in the background, else None
     """
     if os.environ.get("FASTTLD_NO_AUTO_UPDATE") == "1":
-        return
-    need_update = False
-    file_path = os.path.dirname(os.path.realpath(__file__)) + "/public_suffix_list.dat"
-    if os.path.isfile(file_path):
-        # updates in 3 days
-        if (time.time() - os.path.getmtime(file_path))/3600/24 > 3:
-            need_update = True
-    else:
-        # file not found
-        need_update = True
-    if need_update:
+        return None
+    if not needs_update():
+        return None
+
+    def run():
         update(show_output=False)
+        if callback is not None:
+            callback()
 
+    if not background:
+        run()
+        return None
+
+    def run_quietly():
+        try:
+            run()
+        except Exception:
+            pass
 
-auto_update()
+    thread = threading.Thread(target=run_quietly, name="fasttld-auto-update")
+    thread.daemon = True
+    thread.start()
+    return thread
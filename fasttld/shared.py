@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Extractor for sharing one instance across many threads, see SharedFastTLDExtract.
+@author: Jophy and Wu Tingfeng
+@file: shared.py
+
+Copyright (c) 2022 Wu Tingfeng
+Copyright (c) 2017-2018 Jophy
+"""
+import threading
+from itertools import count
+from types import MappingProxyType
+
+from fasttld.FastTLDExtract import CacheInfo, ExtractStats, FastTLDExtract, LRUCache
+
+# Number of independently locked parts of the host cache, and of the counters of stats=True
+DEFAULT_CACHE_SHARDS = 16
+
+
+def freeze_trie(node):
+    """
+    Read-only copy of a dict trie built by FastTLDExtract._trie_construct(), with every dict
+    replaced by a MappingProxyType.
+    """
+    if node is True:
+        return node
+    return MappingProxyType(dict((label, freeze_trie(child)) for label, child in node.items()))
+
+
+def freeze_compiled_trie(node):
+    """Read-only copy of a trie compiled by FastTLDExtract._trie_compile(). Nodes are tuples already."""
+    children, wildcard, exceptions = node
+    if children is None:
+        return node
+    children = MappingProxyType(dict((label, freeze_compiled_trie(child)) for label, child in children.items()))
+    return children, wildcard, exceptions
+
+
+class ShardedLRUCache(object):
+    """
+    LRUCache split into shards by the hash of the key, each with its own lock,
+    so that threads inserting different hosts on cache misses rarely wait on each other. Hits take no lock.
+    Same interface as LRUCache. maxsize is divided between the shards, so that together they hold
+    up to maxsize entries, though a shard may evict while others still have room.
+    """
+
+    def __init__(self, maxsize, shards=DEFAULT_CACHE_SHARDS):
+        shards = max(1, min(shards, maxsize))
+        self.maxsize = maxsize
+        size, remainder = divmod(maxsize, shards)
+        self._shards = [LRUCache(size + (i < remainder)) for i in range(shards)]
+
+    def get(self, key, default=None):
+        shards = self._shards
+        return shards[hash(key) % len(shards)].get(key, default)
+
+    def put(self, key, value):
+        shards = self._shards
+        shards[hash(key) % len(shards)].put(key, value)
+
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+
+    def info(self):
+        infos = [shard.info() for shard in self._shards]
+        return CacheInfo(
+            sum(info.hits for info in infos),
+            sum(info.misses for info in infos),
+            sum(info.evictions for info in infos),
+            self.maxsize,
+            sum(info.currsize for info in infos),
+        )
+
+
+class ShardedExtractStats(object):
+    """
+    ExtractStats split into shards, each with its own lock. Each thread records into one shard,
+    assigned in turn when it first records, so that threads rarely wait on each other.
+    Same interface as ExtractStats. as_dict() adds up the shards.
+    """
+
+    def __init__(self, shards=DEFAULT_CACHE_SHARDS):
+        self._shards = [ExtractStats() for _ in range(max(1, shards))]
+        self._local = threading.local()
+        self._next_shard = count()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = self._shards[next(self._next_shard) % len(self._shards)]
+            return shard
+
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+
+    def record_lookup(self, host, rule):
+        self._shard().record_lookup(host, rule)
+
+    def record_format(self, seconds):
+        self._shard().record_format(seconds)
+
+    def record_trie_build(self, seconds, size):
+        # Figures of the last trie construction, kept in the first shard
+        self._shards[0].record_trie_build(seconds, size)
+
+    def as_dict(self):
+        stats = self._shards[0].as_dict()
+        for shard in self._shards[1:]:
+            for key, value in shard.as_dict().items():
+                if not key.startswith("trie_"):
+                    stats[key] += value
+        return stats
+
+
+class SharedFastTLDExtract(FastTLDExtract):
+    """
+    FastTLDExtract for sharing one instance across the threads of a server.
+    All of its methods can be called from any number of threads at the same time:
+    - The trie of the dict engine is read-only, made of MappingProxyType views and tuples,
+      so neither this module nor its users can modify it while it is read.
+      The compact engines are read-only already.
+    - reload() (eg. from auto_update) builds a new trie and publishes it with a single assignment.
+    - The host cache enabled with cache_size is sharded, see ShardedLRUCache.
+    - So are the counters enabled with stats=True, see ShardedExtractStats.
+    Nothing else is shared between calls, so on free-threaded CPython builds, threads extract in parallel.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        :param cache_shards: Number of independently locked shards of the host cache, and of the counters
+        enabled with stats=True.
+        Other parameters are those of FastTLDExtract.
+        """
+        self.cache_shards = kwargs.pop("cache_shards", DEFAULT_CACHE_SHARDS)
+        super(SharedFastTLDExtract, self).__init__(*args, **kwargs)
+
+    def _cache_construct(self, cache_size):
+        return ShardedLRUCache(cache_size, self.cache_shards)
+
+    def _stats_construct(self):
+        return ShardedExtractStats(self.cache_shards)
+
+    def _trie_load(self, file_path, digest):
+        trie, compiled = super(SharedFastTLDExtract, self)._trie_load(file_path, digest)
+        if self.engine == "dict":
+            trie, compiled = freeze_trie(trie), freeze_compiled_trie(compiled)
+        return trie, compiled
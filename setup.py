@@ -7,11 +7,7 @@ version = 'v0.3.0'
 
 
 def test_suite():
-    try:
-        import unittest2
-        unittest = unittest2
-    except Exception:
-        import unittest
+    import unittest
 
     test_loader = unittest.TestLoader()
     test_suite = test_loader.discover('tests', pattern='maintest.py')
@@ -38,23 +34,29 @@ setup(
                 'structure implemented with the builtin python dict().',
     include_package_data=True,
     zip_safe=False,
+    python_requires='>=3.7',
     install_requires=['idna', 'setuptools'],
+    extras_require={
+        'numpy': ['numpy'],
+        'pandas': ['pandas'],
+        'arrow': ['pyarrow'],
+    },
     test_suite='setup.test_suite',
+    entry_points={
+        'console_scripts': ['fasttld = fasttld.cli:main'],
+    },
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Topic :: Utilities",
         "License :: OSI Approved :: MIT License",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.6",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.3",
-        "Programming Language :: Python :: 3.4",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3 :: Only",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
+        "Programming Language :: Python :: 3.12",
+        "Programming Language :: Python :: 3.13",
                  ],
 )
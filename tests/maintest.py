@@ -1,7 +1,46 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
+from unittest import mock
 
-from fasttld import FastTLDExtract
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from fasttld import FastTLDExtract, SharedFastTLDExtract, aio, cli, extract_parallel, parallel, psl
+from fasttld.FastTLDExtract import TLDResult, looks_like_ip
+from fasttld.psl import getSnapshotPath
+from fasttld.shared import ShardedLRUCache
+
+
+def psl_hosts():
+    """Host names around every rule of the bundled public suffix list, for comparing engines."""
+    hosts = ["", "com", "www.abc.noexists", "a..com", "127.0.0.1", "this is a text without a domain"]
+    for rule in psl.getPublicSuffixList("")[2]:
+        rule = rule.lstrip("!").replace("*", "x")
+        hosts.extend([rule, "a." + rule, "b.a." + rule])
+    return hosts
+
+
+TEST_DAT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test.dat")
 
 all_suffix = FastTLDExtract(exclude_private_suffix=False)
 no_private_suffix = FastTLDExtract(exclude_private_suffix=True)
@@ -22,6 +61,19 @@ class FastTLDExtractCase(unittest.TestCase):
         self.assertEqual(trie["ee"]["com"]["blogspot"], True)
         self.assertEqual(trie["com"]["0emm"]["*"], True)
 
+    def test_trie_dict_on_demand(self):
+        extractor = FastTLDExtract()
+        # Only the compiled trie is kept, until the trie dict is read
+        self.assertIsNone(extractor._trie_dict)
+        self.assertEqual(extractor.trie, all_suffix.trie)
+        self.assertIs(extractor.trie, extractor.trie)
+        self.assertLess(extractor.memory_usage(), 1200000)
+        extractor._file_digest = "outdated"
+        extractor.reload()
+        self.assertIsNone(extractor._trie_dict)
+        self.assertTrue(extractor.is_public_suffix("co.uk"))
+        self.assertIsNone(extractor._trie_dict)
+
     def test_idn_suffix_trie(self):
         trie = all_suffix.trie
         self.assertEqual(trie["香港"]["公司"], True)
@@ -157,6 +209,21 @@ class FastTLDExtractCase(unittest.TestCase):
         self.assertEqual(no_private_suffix.extract("食狮.com.cn"),
                          ("", "", "", "食狮", "com.cn", "", "", "食狮.com.cn"))
 
+    def test_format(self):
+        self.assertEqual(all_suffix.format(" WWW.Google.COM "), "www.google.com")
+        self.assertEqual(all_suffix.format("食狮.com.cn"), "xn--85x722f.com.cn")
+        self.assertEqual(all_suffix.format("食狮。公司.香港"), "xn--85x722f.xn--55qx5d.xn--j6w193g")
+        self.assertEqual(
+            all_suffix.format("HTTPS://User@WWW.食狮.com.cn:8080/路径?q=食狮"),
+            "https://user@www.xn--85x722f.com.cn:8080/路径?q=食狮",
+        )
+        self.assertEqual(all_suffix.format("https://www.google.com/路径"), "https://www.google.com/路径")
+        self.assertEqual(
+            all_suffix.extract("https://www.食狮.公司.香港/a", format=True),
+            ("https://", "", "www", "xn--85x722f", "xn--55qx5d.xn--j6w193g", "", "a",
+             "xn--85x722f.xn--55qx5d.xn--j6w193g"),
+        )
+
     def test_punycode(self):
         self.assertEqual(
             all_suffix.extract("xn--85x722f.com.cn"),
@@ -262,6 +329,764 @@ class FastTLDExtractCase(unittest.TestCase):
             all_suffix_asserts[3],
         )
 
+    def test_extract_host(self):
+        todo = [
+            "www.google.co.uk",
+            "abc.google.blogspot.com.",
+            "127.0.0.1",
+            "www.abc.noexists",
+            "big.news.www.ck",
+            "ck",
+        ]
+        cached = FastTLDExtract(cache_size=10)
+        for extractor in (all_suffix, no_private_suffix, cached):
+            for t in todo:
+                result = extractor.extract(t)
+                self.assertEqual(
+                    extractor.extract_host(t),
+                    (result.subdomain, result.domain, result.suffix, result.domain_name),
+                )
+                self.assertEqual(extractor.extract_host(t, subdomain=False).subdomain, "")
+                self.assertEqual(extractor.extract_domain_name(t), result.domain_name)
+        self.assertEqual(all_suffix.extract_host("abc.google.blogspot.com").domain_name, "google.blogspot.com")
+        self.assertEqual(all_suffix.extract_domain_name("192.168.1.1"), "192.168.1.1")
+
+    def test_extract_many(self):
+        todo = [
+            "www.google.co.uk",
+            "https://abc.google.blogspot.com:8080/a/long/path?query=42things",
+            "127.0.0.1",
+            "www.abc.noexists",
+            "user@[::1]:65536/x",
+            " WWW.食狮.公司.cn:08/y\n",
+            "",
+        ]
+        self.assertEqual(all_suffix.extract_many(todo), [all_suffix.extract(t) for t in todo])
+        self.assertEqual(
+            all_suffix.extract_many(iter(todo), subdomain=False),
+            [all_suffix.extract(t, subdomain=False) for t in todo],
+        )
+        self.assertEqual(all_suffix.extract_many(todo, format=True), [all_suffix.extract(t, format=True) for t in todo])
+        self.assertEqual(all_suffix.extract_many([]), [])
+        results = all_suffix.extract_many(todo)
+        self.assertTrue(all(type(result) is TLDResult for result in results))
+        self.assertEqual(results[0].domain_name, "google.co.uk")
+        # The first lookup of a lazy=True instance builds its trie
+        self.assertEqual(FastTLDExtract(lazy=True, cache_size=2).extract_many(todo), results)
+
+    def test_extract_parallel(self):
+        todo = [
+            "www.google.co.uk",
+            "https://abc.google.blogspot.com:8080/a/long/path?query=42things",
+            "127.0.0.1",
+            "www.abc.noexists",
+            "www.myownblog.blogspot.ca",
+        ] * 5
+        expected = no_private_suffix.extract_many(todo)
+        for processes in (1, 2):
+            self.assertEqual(
+                extract_parallel(iter(todo), processes=processes, chunk_size=4, columnar=False,
+                                 exclude_private_suffix=True),
+                expected,
+            )
+        columns = extract_parallel(todo, processes=2, chunk_size=7, subdomain=False)
+        self.assertEqual(list(columns), list(TLDResult._fields))
+        self.assertEqual(columns["domain_name"], [r.domain_name for r in all_suffix.extract_many(todo)])
+        self.assertEqual(columns["subdomain"], [""] * len(todo))
+        self.assertEqual(extract_parallel([], processes=1), dict((f, []) for f in columns))
+        # processes=1 extracts with a local extractor, not the worker extractor of the module
+        self.assertIsNone(parallel._extractor)
+        self.assertEqual(
+            extract_parallel(todo, processes=2, chunk_size=7, fields=["suffix"]),
+            {"suffix": [r.suffix for r in all_suffix.extract_many(todo)]},
+        )
+
+    def test_extract_many_dedup(self):
+        todo = [
+            "www.google.co.uk",
+            "www.google.co.uk.",
+            " www.google.co.uk\n",
+            "https://abc.google.blogspot.com:8080/a",
+            "127.0.0.1",
+            "WWW.食狮.公司.cn",
+            "www.食狮.公司.cn",
+            "",
+        ] * 10
+        for format in (False, True):
+            results, info = all_suffix.extract_many_dedup(iter(todo), format=format)
+            self.assertEqual(results, all_suffix.extract_many(todo, format=format))
+            self.assertEqual(info.rows, len(todo))
+            self.assertEqual(info.ratio, float(info.rows) / info.unique)
+        self.assertEqual(all_suffix.extract_many_dedup(todo)[1].unique, 6)
+        self.assertEqual(all_suffix.extract_many_dedup(todo, format=True)[1].unique, 5)
+        # Distinct URLs of the same host share a trie walk
+        rows = ["https://www.google.co.uk/%d" % i for i in range(50)] + ["www.google.co.uk:%d" % i for i in range(50)]
+        with mock.patch.object(all_suffix, "_lookup", wraps=all_suffix._lookup) as lookup:
+            results, info = all_suffix.extract_many_dedup(rows)
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(results, all_suffix.extract_many(rows))
+        self.assertEqual(info, (100, 1, 100.0))
+        results, info = no_private_suffix.extract_many_dedup(todo, subdomain=False)
+        self.assertEqual(results, no_private_suffix.extract_many(todo, subdomain=False))
+        self.assertEqual(all_suffix.extract_many_dedup([]), ([], (0, 0, 1.0)))
+
+    def test_extract_async(self):
+        todo = [
+            "www.google.co.uk",
+            "https://abc.google.blogspot.com:8080/a/long/path?query=42things",
+            "127.0.0.1",
+            "www.abc.noexists",
+            "WWW.食狮.公司.cn",
+        ] * 5
+
+        async def stream():
+            for url in todo:
+                await asyncio.sleep(0)
+                yield url
+
+        async def collect():
+            return [result async for result in aio.extract_stream(all_suffix, stream(), chunk_size=4, format=True)]
+
+        async def concurrently():
+            # Other tasks keep running while the chunks are extracted
+            ticks = []
+
+            async def ticker():
+                while True:
+                    ticks.append(1)
+                    await asyncio.sleep(0)
+
+            task = asyncio.ensure_future(ticker())
+            results = await aio.extract_many_async(no_private_suffix, todo, chunk_size=2, subdomain=False)
+            task.cancel()
+            return results, ticks
+
+        self.assertEqual(asyncio.run(collect()), all_suffix.extract_many(todo, format=True))
+        results, ticks = asyncio.run(concurrently())
+        self.assertEqual(results, no_private_suffix.extract_many(todo, subdomain=False))
+        self.assertGreater(len(ticks), 1)
+        self.assertEqual(asyncio.run(aio.extract_many_async(all_suffix, [])), [])
+
+    def test_extract_columns(self):
+        todo = [
+            "www.google.co.uk",
+            "https://user@abc.google.blogspot.com:8080/a/long/path?query=42things",
+            "127.0.0.1",
+            "www.abc.noexists",
+        ]
+        results = all_suffix.extract_many(todo, subdomain=False)
+        columns = all_suffix.extract_columns(todo, subdomain=False)
+        self.assertEqual(list(columns), list(TLDResult._fields))
+        for field in TLDResult._fields:
+            self.assertEqual(columns[field], [getattr(r, field) for r in results])
+        self.assertEqual(
+            all_suffix.extract_columns(iter(todo), fields=["domain_name"]),
+            {"domain_name": ["google.co.uk", "google.blogspot.com", "127.0.0.1", ""]},
+        )
+        columns = all_suffix.extract_columns(todo, fields=["port", "domain"])
+        self.assertEqual(list(columns), ["port", "domain"])
+        self.assertEqual(columns["port"], ["", "8080", "", ""])
+        self.assertEqual(all_suffix.extract_columns([], fields=["suffix", "port"]), {"suffix": [], "port": []})
+        # Fields may be any iterable, and host fields alone take the host-only path
+        host_fields = ["subdomain", "domain", "suffix", "domain_name"]
+        for subdomain in (True, False):
+            columns = all_suffix.extract_columns(todo, (field for field in host_fields), subdomain, True)
+            self.assertEqual(list(columns), host_fields)
+            results = all_suffix.extract_many(todo, subdomain, True)
+            for field in host_fields:
+                self.assertEqual(columns[field], [getattr(r, field) for r in results])
+        self.assertRaises(ValueError, all_suffix.extract_columns, todo, ["host"])
+        self.assertRaises(ValueError, all_suffix.extract_columns, todo, None, True, False, "arrow")
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_extract_columns_numpy(self):
+        columns = all_suffix.extract_columns(["www.google.co.uk", "127.0.0.1"], ["domain", "suffix"],
+                                             array_type="numpy")
+        self.assertIsInstance(columns["domain"], numpy.ndarray)
+        self.assertEqual(columns["domain"].tolist(), ["google", "127.0.0.1"])
+
+    @unittest.skipIf(pandas is None, "pandas is not installed")
+    def test_extract_columns_pandas(self):
+        df = all_suffix.extract_columns(["www.google.co.uk", "127.0.0.1"], ["domain", "suffix"],
+                                        array_type="pandas")
+        self.assertEqual(list(df.columns), ["domain", "suffix"])
+        self.assertEqual(df["suffix"].tolist(), ["co.uk", ""])
+
+    @unittest.skipIf(pandas is None, "pandas is not installed")
+    def test_extract_series(self):
+        from fasttld.dataframe import extract_series
+        todo = ["www.google.co.uk", None, "https://u@abc.google.blogspot.com:8080/a", "127.0.0.1", "www.google.co.uk"]
+        series = pandas.Series(todo, index=[10, 11, 12, 13, 14])
+        df = extract_series(series, all_suffix)
+        self.assertEqual(list(df.columns), list(TLDResult._fields))
+        self.assertEqual(list(df.index), [10, 11, 12, 13, 14])
+        expected = all_suffix.extract_many([url for url in todo if url is not None])
+        rows = [tuple(row) for row in df.drop(11).itertuples(index=False)]
+        self.assertEqual(rows, [tuple(result) for result in expected])
+        self.assertTrue(df.loc[11].isna().all())
+
+        df = extract_series(series, no_private_suffix, fields=["suffix"], subdomain=False)
+        self.assertEqual(list(df.columns), ["suffix"])
+        self.assertEqual(df["suffix"][12], "com")
+        self.assertEqual(len(extract_series(pandas.Series([], dtype=object), all_suffix)), 0)
+        with self.assertRaises(ValueError):
+            extract_series(series, all_suffix, fields=["tld"])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_extract_arrow(self):
+        from fasttld.dataframe import extract_arrow
+        todo = ["www.google.co.uk", None, "https://u@abc.google.blogspot.com:8080/a", "127.0.0.1",
+                "WWW.食狮.公司.cn", "www.google.co.uk"]
+        expected = dict((field, [None if url is None else getattr(all_suffix.extract(url, format=True), field)
+                                 for url in todo]) for field in TLDResult._fields)
+        for array in (pyarrow.array(todo), pyarrow.chunked_array([todo[:2], todo[2:]])):
+            for chunk_size in (1, 4, 100):
+                batch = extract_arrow(array, all_suffix, format=True, chunk_size=chunk_size)
+                self.assertIsInstance(batch, pyarrow.RecordBatch)
+                self.assertEqual(batch.to_pydict(), expected)
+        batch = extract_arrow(pyarrow.array(todo, type=pyarrow.large_string()), all_suffix, fields=["domain_name"])
+        self.assertEqual(batch.schema.names, ["domain_name"])
+        self.assertEqual(batch.column(0).type, pyarrow.string())
+        self.assertEqual(extract_arrow(pyarrow.array([], type=pyarrow.string()), all_suffix).num_rows, 0)
+
+    def test_stats(self):
+        self.assertIsNone(all_suffix.stats())
+        self.assertEqual(all_suffix._format, all_suffix.format)
+
+        todo = ["www.ck", "foo.ck", "a.b.kawasaki.jp", "city.kawasaki.jp", "1.2.3.4", "[::1]", "x.noexist",
+                "https://WWW.食狮.com.cn/a", ""]
+        dict_stats = FastTLDExtract(stats=True, cache_size=4)
+        for url in todo:
+            self.assertEqual(dict_stats.extract(url, format=True), all_suffix.extract(url, format=True))
+        stats = dict_stats.stats()
+        self.assertEqual(
+            dict((key, stats[key]) for key in ("lookups", "ip_addresses", "unmatched", "wildcard_hits",
+                                               "exception_hits", "format_calls", "trie_builds", "cache_misses")),
+            {"lookups": 9, "ip_addresses": 2, "unmatched": 2, "wildcard_hits": 2, "exception_hits": 2,
+             "format_calls": 9, "trie_builds": 1, "cache_misses": 9},
+        )
+        self.assertGreater(stats["format_seconds"], 0)
+        self.assertGreater(stats["trie_build_seconds"], 0)
+        self.assertEqual(stats["trie_bytes"], dict_stats.memory_usage())
+
+        dict_stats.stats_clear()
+        self.assertEqual(dict_stats.stats()["lookups"], 0)
+        self.assertEqual(dict_stats.stats()["trie_builds"], 1)
+
+        # Both engines classify the rules of every host alike
+        compact_stats = FastTLDExtract(stats=True, engine="compact")
+        dict_stats = FastTLDExtract(stats=True)
+        for host in psl_hosts():
+            compact_stats.extract_host(host)
+            dict_stats.extract_host(host)
+        for key in ("lookups", "ip_addresses", "unmatched", "wildcard_hits", "exception_hits"):
+            self.assertEqual(compact_stats.stats()[key], dict_stats.stats()[key], key)
+        self.assertGreater(dict_stats.stats()["exception_hits"], 0)
+
+    def test_shared(self):
+        shared = SharedFastTLDExtract(cache_size=64, cache_shards=4)
+        with self.assertRaises(TypeError):
+            shared.trie["com"] = True
+        with self.assertRaises(TypeError):
+            shared._compiled_trie[0]["com"] = None
+        self.assertEqual(shared.trie, all_suffix.trie)
+        self.assertGreater(shared.memory_usage(), 0)
+
+        hosts = psl_hosts()[::4]
+        expected = [all_suffix.extract_host(host) for host in hosts]
+        errors = []
+
+        def work():
+            try:
+                for _ in range(2):
+                    if [shared.extract_host(host) for host in hosts] != expected:
+                        errors.append("mismatch")
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        def run_threads(reloads):
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for _ in range(reloads):
+                # Swap in a new trie while the threads extract
+                shared._file_digest = "outdated"
+                self.assertTrue(shared.reload())
+            for thread in threads:
+                thread.join()
+
+        run_threads(3)
+        self.assertEqual(errors, [])
+        # Counters restart with the cache at each reload(), so count a run without reloads
+        before = shared.cache_info()
+        run_threads(0)
+        self.assertEqual(errors, [])
+        info = shared.cache_info()
+        self.assertEqual(info.maxsize, 64)
+        self.assertLessEqual(info.currsize, 64)
+        # The counters are not locked, so concurrent increments may be lost
+        lookups = info.hits + info.misses - before.hits - before.misses
+        self.assertGreater(lookups, 0)
+        self.assertLessEqual(lookups, 4 * 2 * len(hosts))
+
+        compact = SharedFastTLDExtract(engine="compact")
+        self.assertEqual(compact.extract("www.google.co.uk"), all_suffix.extract("www.google.co.uk"))
+
+    def test_sharded_cache(self):
+        cache = ShardedLRUCache(10, shards=4)
+        for i in range(100):
+            cache.put(str(i), i)
+        self.assertEqual(cache.get("99"), 99)
+        self.assertIsNone(cache.get("0"))
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses, info.maxsize), (1, 1, 10))
+        self.assertEqual(info.currsize, 10)
+        self.assertEqual(info.evictions, 100 - info.currsize)
+        cache.clear()
+        self.assertEqual(cache.info().currsize, 0)
+        self.assertEqual(ShardedLRUCache(2, shards=16).info().maxsize, 2)
+        self.assertEqual(sum(shard.maxsize for shard in ShardedLRUCache(100, shards=16)._shards), 100)
+
+    def test_sharded_stats(self):
+        shared = SharedFastTLDExtract(stats=True, cache_shards=4)
+        hosts = ["www.google.co.uk", "127.0.0.1", "foo.ck", "www.ck", "a.noexist"]
+
+        def work():
+            for host in hosts:
+                shared.extract(host, format=True)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = shared.stats()
+        self.assertEqual(len(set(id(shard) for shard in shared._stats._shards)), 4)
+        self.assertEqual((stats["lookups"], stats["format_calls"]), (8 * len(hosts), 8 * len(hosts)))
+        for key in ("ip_addresses", "unmatched", "wildcard_hits", "exception_hits"):
+            self.assertEqual(stats[key], 8, key)
+        self.assertEqual(stats["trie_builds"], 1)
+        self.assertGreater(stats["trie_bytes"], 0)
+        shared.stats_clear()
+        self.assertEqual(shared.stats()["lookups"], 0)
+
+    def test_suffix_index(self):
+        index = all_suffix.suffix_index()
+        self.assertIs(all_suffix.suffix_index(), index)
+        for s in ["com", "co.uk", "blogspot.co.uk", "ck", "foo.ck", "a.kawasaki.jp", "公司.cn", "xn--55qx5d.cn"]:
+            self.assertTrue(index.is_public_suffix(s), s)
+            self.assertIn(s, index)
+        for s in ["", "google.com", "www.ck", "city.kawasaki.jp", ".ck", "noexist", "a.blogspot.co.uk"]:
+            self.assertFalse(index.is_public_suffix(s), s)
+        self.assertFalse(no_private_suffix.is_public_suffix("blogspot.co.uk"))
+
+        # Same as extract() for every engine
+        for extractor in (all_suffix, no_private_suffix, FastTLDExtract(engine="compact")):
+            is_public_suffix = extractor.suffix_index().is_public_suffix
+            for host in psl_hosts():
+                self.assertEqual(is_public_suffix(host), host != "" and extractor.extract_host(host).suffix == host,
+                                 host)
+
+        self.assertIn("co.uk", index.children("uk"))
+        self.assertEqual(list(index.children("uk")), sorted(index.children("uk")))
+        self.assertIn("com", index.children())
+        self.assertEqual(index.children("noexist"), ())
+        under_uk = list(index.iter_suffixes("uk"))
+        self.assertEqual(under_uk[0], "uk")
+        self.assertIn("blogspot.co.uk", under_uk)
+        self.assertTrue(all(s == "uk" or s.endswith(".uk") for s in under_uk))
+        self.assertEqual(list(index.iter_suffixes("ac.uk")), ["ac.uk"])
+        self.assertEqual(list(index.iter_suffixes("noexist")), [])
+        self.assertEqual(len(list(index.iter_suffixes())), len(index))
+        self.assertIn("*.ck", index.wildcard_rules)
+        self.assertIn("!www.ck", index.exception_rules)
+
+        # Rebuilt with the trie
+        extractor = FastTLDExtract(file_path=TEST_DAT, snapshot=False)
+        self.assertTrue(extractor.is_public_suffix("user-define.com"))
+        old_index = extractor.suffix_index()
+        extractor._file_digest = "outdated"
+        extractor.reload()
+        self.assertIsNot(extractor.suffix_index(), old_index)
+        self.assertTrue(extractor.is_public_suffix("user-define.com"))
+
+    def test_lazy(self):
+        extractor = FastTLDExtract(lazy=True, cache_size=10)
+        self.assertIsNone(extractor.trie)
+        self.assertEqual(extractor.extract("www.google.co.uk"), all_suffix.extract("www.google.co.uk"))
+        self.assertEqual(extractor.trie, all_suffix.trie)
+        self.assertEqual(extractor.cache_info().currsize, 1)
+        self.assertEqual(extractor.extract_host("127.0.0.1"), all_suffix.extract_host("127.0.0.1"))
+
+        compact = FastTLDExtract(lazy=True, engine="compact")
+        self.assertGreater(compact.memory_usage(), 0)
+        self.assertEqual(compact.extract_domain_name("a.b.example.com"), "example.com")
+
+    def test_benchmark_suite(self):
+        from tests import performance
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            out_path = os.path.join(tmp_dir, "bench.json")
+            performance.main(["--corpus-size", "100", "--repeat", "1", "--engines", "dict,compact", "-o", out_path])
+            with open(out_path) as fd:
+                report = json.load(fd)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(set(report["memory"]["results"]), {"dict", "compact"})
+        self.assertIn("dict_snapshot", report["construction"]["results"])
+        for corpus in ("idn", "ip", "wildcard_exception", "full_urls", "long_subdomains"):
+            self.assertGreater(report["throughput"]["results"]["compact"][corpus]["mean"], 0)
+            self.assertEqual(report["latency"]["results"]["dict"][corpus]["n"], 2)
+        self.assertEqual(performance.build_corpora(10, 1), performance.build_corpora(10, 1))
+        self.assertEqual(report["import"]["results"]["heavy_modules"], [])
+        self.assertGreater(report["threads"]["results"]["4_threads_cache"]["mean"], 0)
+        self.assertGreater(report["dedup"]["results"]["10_unique"]["ratio"], 1)
+        self.assertGreater(report["bytes"]["results"]["extract_bytes_spans"]["mean"], 0)
+        self.assertGreater(report["import"]["results"]["import"]["min"], 0)
+
+    def test_cli(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            todo = ["https://www.google.co.uk:8080/a", "127.0.0.1", "", "foo.blogspot.com"]
+            plain_path = os.path.join(tmp_dir, "urls.txt")
+            gzip_path = os.path.join(tmp_dir, "urls.gz")
+            out_path = os.path.join(tmp_dir, "out")
+            with open(plain_path, "w") as fd:
+                fd.write("\n".join(todo[:2]) + "\n")
+            with gzip.open(gzip_path, "wb") as fd:
+                fd.write(("\n".join(todo[2:]) + "\n").encode())
+
+            self.assertEqual(cli.main([plain_path, gzip_path, "-o", out_path]), 0)
+            with open(out_path) as fd:
+                self.assertEqual(fd.read().splitlines(), ["\t".join(all_suffix.extract(t)) for t in todo])
+
+            cli.main([gzip_path, plain_path, "-o", out_path, "-t", "jsonl", "-f", "domain_name,port",
+                      "--exclude-private-suffix", "--batch-size", "1"])
+            with open(out_path) as fd:
+                self.assertEqual(
+                    [json.loads(line) for line in fd],
+                    [{"domain_name": "", "port": ""}, {"domain_name": "blogspot.com", "port": ""},
+                     {"domain_name": "google.co.uk", "port": "8080"}, {"domain_name": "127.0.0.1", "port": ""}],
+                )
+
+            cli.main([plain_path, "-o", out_path, "-t", "csv", "--header", "-f", "subdomain,domain"])
+            with open(out_path) as fd:
+                self.assertEqual(fd.read(), "subdomain,domain\nwww,google\n,127.0.0.1\n")
+
+            # Tabs and backslashes in fields are escaped, so columns stay in place
+            with open(plain_path, "w") as fd:
+                fd.write("a.com/x\ty\\z\nb.com/p\n")
+            cli.main([plain_path, "-o", out_path, "-f", "domain_name,path"])
+            with open(out_path) as fd:
+                self.assertEqual(fd.read(), "a.com\tx\\ty\\\\z\nb.com\tp\n")
+
+            with self.assertRaises(SystemExit):
+                cli.main([plain_path, "-o", out_path, "--batch-size", "0"])
+
+            # Missing input and output files are reported as usage errors, without a traceback
+            stderr = io.StringIO()
+            with mock.patch("sys.stderr", stderr), self.assertRaises(SystemExit) as raised:
+                cli.main([os.path.join(tmp_dir, "missing.txt"), "-o", out_path])
+            self.assertEqual(raised.exception.code, 2)
+            self.assertIn("missing.txt", stderr.getvalue())
+            with mock.patch("sys.stderr", io.StringIO()), self.assertRaises(SystemExit):
+                cli.main([plain_path, "-o", os.path.join(tmp_dir, "missing", "out")])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_cache(self):
+        cached = FastTLDExtract(cache_size=3)
+        todo = [
+            "https://abc.google.blogspot.com",
+            "ftp://user@abc.google.blogspot.com:8080/a/long/path?query=42things",
+            "abc.google.blogspot.com/path",
+            "https://192.168.1.1:8080",
+            "192.168.1.1",
+            "www.abc.noexists",
+        ]
+        for _ in range(2):
+            for t in todo:
+                self.assertEqual(cached.extract(t), all_suffix.extract(t))
+                self.assertEqual(cached.extract(t, subdomain=False), all_suffix.extract(t, subdomain=False))
+        info = cached.cache_info()
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.hits, 21)
+        self.assertEqual(info.evictions, 0)
+        self.assertEqual(info.currsize, 3)
+
+        cached.extract("www.google.co.uk")
+        self.assertEqual(cached.cache_info().evictions, 1)
+        # Hosts hit since they were cached outlive those that were not
+        cached.cache_clear()
+        for t in ("hot.com", "a.com", "b.com", "hot.com", "c.com", "d.com", "hot.com", "e.com"):
+            cached.extract(t)
+        self.assertEqual(list(cached._cache._data), ["d.com", "hot.com", "e.com"])
+        cached.cache_clear()
+        self.assertEqual(cached.cache_info().currsize, 0)
+        self.assertIsNone(all_suffix.cache_info())
+
+    def test_compact_engine(self):
+        hosts = psl_hosts()
+        for exclude_private_suffix, expected in ((False, all_suffix), (True, no_private_suffix)):
+            compact = FastTLDExtract(exclude_private_suffix=exclude_private_suffix, engine="compact")
+            for host in hosts:
+                self.assertEqual(compact.extract(host), expected.extract(host), host)
+            self.assertLess(compact.memory_usage() * 3, expected.memory_usage())
+        self.assertEqual(
+            compact.extract("https://user@abc.google.blogspot.com:8080/a/long/path?query=42things", subdomain=False),
+            ("https://", "user", "", "blogspot", "com", "8080", "a/long/path?query=42things", "blogspot.com"),
+        )
+        self.assertRaises(ValueError, FastTLDExtract, engine="btree")
+
+    def test_mmap_engine(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(tmp_dir, "psl.dat")
+            shutil.copy(psl.PSL_FILE_PATH, file_path)
+            mapped_path = psl.getSnapshotPath(file_path, False, "ctrie")
+            mapped = FastTLDExtract(file_path=file_path, engine="mmap")
+            self.assertTrue(os.path.isfile(mapped_path))
+            mapped_again = FastTLDExtract(file_path=file_path, engine="mmap")
+            for host in psl_hosts()[::7]:
+                self.assertEqual(mapped.extract(host), all_suffix.extract(host), host)
+                self.assertEqual(mapped_again.extract(host), all_suffix.extract(host), host)
+
+            with open(file_path, "a") as fd:
+                fd.write("\nco.user-define.com\n")
+            self.assertTrue(mapped.reload())
+            self.assertEqual(mapped.extract("a.co.user-define.com").suffix, "co.user-define.com")
+            self.assertEqual(FastTLDExtract(file_path=file_path, engine="mmap").trie.digest,
+                             psl.getFileDigest(file_path))
+
+            # Corrupt file. Replaced rather than truncated, since it is mapped by live instances
+            with open(mapped_path + ".tmp", "wb") as fd:
+                fd.write(b"garbage")
+            os.replace(mapped_path + ".tmp", mapped_path)
+            self.assertEqual(FastTLDExtract(file_path=file_path, engine="mmap").extract("a.co.user-define.com"),
+                             mapped.extract("a.co.user-define.com"))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_trie_snapshot(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(tmp_dir, "psl.dat")
+            shutil.copy(TEST_DAT, file_path)
+            snapshot_path = getSnapshotPath(file_path, False)
+
+            built = FastTLDExtract(file_path=file_path)
+            self.assertTrue(os.path.isfile(snapshot_path))
+            loaded = FastTLDExtract(file_path=file_path)
+            self.assertEqual(loaded.trie, built.trie)
+            self.assertEqual(loaded._compiled_trie, built._compiled_trie)
+            self.assertEqual(loaded.extract("www.user-define.com").domain_name, "www.user-define.com")
+
+            # Stale snapshot after the file changes
+            with open(file_path, "a") as fd:
+                fd.write("\nco.user-define.com\n")
+            rebuilt = FastTLDExtract(file_path=file_path)
+            self.assertEqual(rebuilt.extract("a.co.user-define.com").suffix, "co.user-define.com")
+
+            # Corrupt snapshot
+            with open(snapshot_path, "wb") as fd:
+                fd.write(b"garbage")
+            self.assertEqual(FastTLDExtract(file_path=file_path).trie, rebuilt.trie)
+
+            no_snapshot = FastTLDExtract(file_path=file_path, snapshot=False)
+            self.assertEqual(no_snapshot.trie, rebuilt.trie)
+            self.assertEqual(no_snapshot._compiled_trie, rebuilt._compiled_trie)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_background_auto_update(self):
+        release = threading.Event()
+        with mock.patch.dict(os.environ, {"FASTTLD_NO_AUTO_UPDATE": "0"}), \
+                mock.patch.object(psl, "needs_update", return_value=True), \
+                mock.patch.object(psl, "update", side_effect=lambda show_output: release.wait(10)):
+            swapped = threading.Event()
+            release.set()
+            thread = psl.auto_update(background=True, callback=swapped.set)
+            thread.join(10)
+            self.assertTrue(swapped.is_set())
+
+            # extract() keeps working on the old trie until the update has finished
+            release.clear()
+            extractor = FastTLDExtract(exclude_private_suffix=True, auto_update=True)
+            old_trie = extractor.trie
+            self.assertEqual(extractor.extract("www.google.co.uk").domain_name, "google.co.uk")
+            extractor._file_digest = "outdated"  # pretend the download changed the file
+            release.set()
+            for _ in range(1000):
+                if extractor.trie is not old_trie:
+                    break
+                threading.Event().wait(0.01)
+            self.assertIsNot(extractor.trie, old_trie)
+            self.assertEqual(extractor.trie, old_trie)
+
+        with mock.patch.object(psl, "needs_update", return_value=False), \
+                mock.patch.object(psl, "update") as update:
+            self.assertIsNone(psl.auto_update(background=True))
+            self.assertFalse(update.called)
+
+    def test_reload(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(tmp_dir, "psl.dat")
+            shutil.copy(TEST_DAT, file_path)
+            extractor = FastTLDExtract(file_path=file_path)
+            trie = extractor.trie
+            self.assertFalse(extractor.reload())
+            self.assertIs(extractor.trie, trie)
+
+            results = []
+            stop = threading.Event()
+
+            def extract_loop():
+                while not stop.is_set():
+                    results.append(extractor.extract("a.co.user-define.com").suffix)
+
+            thread = threading.Thread(target=extract_loop)
+            thread.start()
+            try:
+                with open(file_path, "a") as fd:
+                    fd.write("\nco.user-define.com\n")
+                self.assertTrue(extractor.reload())
+                threading.Event().wait(0.05)
+            finally:
+                stop.set()
+                thread.join()
+            self.assertEqual(extractor.extract("a.co.user-define.com").suffix, "co.user-define.com")
+            self.assertEqual(set(results) - {"user-define.com"}, {"co.user-define.com"})
+            self.assertFalse(extractor.reload())
+
+            # A lookup of the old trie that finishes after reload() does not leave its result in the cache
+            with open(file_path, "w") as fd:
+                fd.write("com\nuser-define.com\n")
+            cached = FastTLDExtract(file_path=file_path, snapshot=False, cache_size=10)
+            lookup = cached._lookup_uncached
+
+            def lookup_racing_reload(netloc, subdomain):
+                host = lookup(netloc, subdomain)
+                with open(file_path, "a") as fd:
+                    fd.write("co.user-define.com\n")
+                cached.reload()
+                return host
+
+            cached._lookup_uncached = lookup_racing_reload
+            self.assertEqual(cached.extract("a.co.user-define.com").suffix, "user-define.com")
+            cached._lookup_uncached = lookup
+            self.assertEqual(cached.extract("a.co.user-define.com").suffix, "co.user-define.com")
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_url_components(self):
+        self.assertEqual(all_suffix.extract("a.com:+80/x"), ("", "", "", "a", "com", "+80", "x", "a.com"))
+        self.assertEqual(all_suffix.extract("a.com:99999/x"), ("", "", "", "a", "com", "", "", "a.com"))
+        self.assertEqual(all_suffix.extract("a.com:/x"), ("", "", "", "a", "com", "", "", "a.com"))
+        self.assertEqual(all_suffix.extract("a.com?x=/y"), ("", "", "", "a", "com", "", "y", "a.com"))
+        self.assertEqual(all_suffix.extract("a.com#frag"), ("", "", "", "a", "com", "", "", "a.com"))
+        self.assertEqual(all_suffix.extract("u@a.com/x@y"), ("", "u", "", "a", "com", "", "x@y", "a.com"))
+        self.assertEqual(all_suffix.extract("ab://u:p@a.com:1/"), ("ab://", "u:p", "", "a", "com", "1", "", "a.com"))
+        self.assertEqual(all_suffix.extract("://a.com"), ("", "", "", "", "", "", "", ""))
+
+    def test_looks_like_ip(self):
+        import socket
+
+        def inet_aton_accepts(host):
+            try:
+                socket.inet_aton(host)
+            except (OSError, ValueError):
+                return False
+            return True
+
+        # Same IPv4 results as inet_aton, including its lenient forms
+        for host in ["1.2.3.4", "1.1", "4294967295", "0x7f.1", "017.0.0.1", "1.2.3.4 abc", "", "1.2.3.256",
+                     "1.2.3.4.", "08", "0x", "1.example.com", "www.google.com", "a.1.2.3", "١.٢.٣.٤",
+                     "1.2.3.4\x00", "dead.beef", " 1.2.3.4"]:
+            self.assertEqual(looks_like_ip(host), inet_aton_accepts(host), host)
+
+        for host in ["[::1]", "[2001:db8::1]", "[::ffff:1.2.3.4]"]:
+            self.assertTrue(looks_like_ip(host), host)
+        for host in ["::1", "[::g]", "[1.2.3.4]", "[::1", "[]", "[fe80::1%eth0]"]:
+            self.assertFalse(looks_like_ip(host), host)
+
+    def test_ipv6(self):
+        self.assertEqual(all_suffix.extract("http://[::1]:8080/a"), ("", "", "", "[::1]", "", "", "", "[::1]"))
+        self.assertEqual(
+            all_suffix.extract("https://user@[2001:DB8::1]/x"),
+            ("", "", "", "[2001:DB8::1]", "", "", "", "[2001:DB8::1]"),
+        )
+        compact = FastTLDExtract(engine="compact")
+        self.assertEqual(compact.extract("[::1]:8080"), all_suffix.extract("[::1]:8080"))
+        self.assertEqual(all_suffix.extract_host("[::1]"), ("", "[::1]", "", "[::1]"))
+        # Not an IPv6 address, so the host ends at the first ":" as before
+        self.assertEqual(all_suffix.extract("[::g]:80/a"), ("", "", "", "", "", "", "", ""))
+
+    def test_extract_bytes(self):
+        urls = [
+            "https://user@www.google.com.hk:8080/a/b",
+            "\ufeffhttp://食狮.公司.cn:８０/路径. ",
+            "127.0.0.1:80/x",
+            "[::1]:8080",
+            "a.com:99999/x",
+            "www.ck",
+            "",
+            " .\ufeff\ufeff\n",
+            "\ufeff\ufeffa.\ufeffb.co.uk\ufeff.",
+            "ftp://@a.com:/p",
+            "a.com:٣٣/x",
+            "a.com/x:80",
+        ]
+        for url in urls:
+            for subdomain in (True, False):
+                expected = tuple(part.encode("utf-8") for part in all_suffix.extract(url, subdomain))
+                raw = url.encode("utf-8")
+                self.assertEqual(all_suffix.extract_bytes(raw, subdomain), expected, url)
+                self.assertEqual(all_suffix.extract_bytes(bytearray(raw), subdomain), expected, url)
+                result = all_suffix.extract_bytes(memoryview(raw), subdomain)
+                self.assertTrue(all(isinstance(part, memoryview) for part in result))
+                self.assertEqual(tuple(bytes(part) for part in result), expected, url)
+                spans = all_suffix.extract_bytes(raw, subdomain, spans=True)
+                self.assertEqual(tuple(raw[start:end] for start, end in spans), expected, url)
+
+        raw = b"GET https://www.google.com.hk:8080/a HTTP/1.1"
+        res = all_suffix.extract_bytes(memoryview(raw)[4:36], spans=True)
+        self.assertEqual(res.domain_name, (12, 25))
+        self.assertEqual(res.userinfo[0], res.userinfo[1])
+
+        # Every engine, with or without the host cache and counters, gives the same results,
+        # and invalid UTF-8 does not raise
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(tmp_dir, "psl.dat")
+            shutil.copy(psl.PSL_FILE_PATH, file_path)
+            extractors = [
+                FastTLDExtract(engine="compact"),
+                FastTLDExtract(file_path=file_path, engine="mmap", snapshot=False),
+                FastTLDExtract(engine="compact", cache_size=10, stats=True),
+                FastTLDExtract(cache_size=10, stats=True),
+                FastTLDExtract(lazy=True),
+            ]
+            invalid = [b"a.b\xc3.co.uk", b"http://\xff\xfe.com/a", b"\xff.google.com:80", b"foo.\xe9.ck",
+                       b"\xef\xbb\xbf\xbb\xbf\xbb\xbf.com\xef\xbb"]
+            for extractor in extractors:
+                for raw in [url.encode("utf-8") for url in urls] + invalid:
+                    expected = tuple(part.encode("utf-8", "surrogateescape")
+                                     for part in all_suffix.extract(raw.decode("utf-8", "surrogateescape")))
+                    self.assertEqual(extractor.extract_bytes(raw), expected, (extractor.engine, raw))
+                    spans = extractor.extract_bytes(memoryview(raw), spans=True)
+                    self.assertEqual(tuple(raw[start:end] for start, end in spans), expected, (extractor.engine, raw))
+            self.assertEqual(extractors[0].extract_bytes(b"a.b\xc3.co.uk").domain_name, b"b\xc3.co.uk")
+            self.assertEqual(extractors[2].stats()["lookups"], 2 * (len(urls) + len(invalid)))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        # The UTF-8 copy of the trie is made again after reload()
+        extractor = FastTLDExtract(file_path=TEST_DAT, snapshot=False)
+        self.assertEqual(extractor.extract_bytes(b"a.co.user-define.com").suffix, b"user-define.com")
+        extractor._compiled_trie = extractor._trie_compile({"com": {"user-define": {"co": True}}})
+        self.assertEqual(extractor.extract_bytes(b"a.co.user-define.com").suffix, b"co.user-define.com")
+
     def test_random_text(self):
         self.assertEqual(all_suffix.extract("this is a text without a domain"), ("", "", "", "", "", "", "", ""))
         self.assertEqual(all_suffix.extract("Null byte\x00string"), ("", "", "", "", "", "", "", ""))
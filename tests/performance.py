@@ -2,7 +2,12 @@
 # -*- coding: utf-8 -*-
 
 """
-Performance comparison with similar modules
+Benchmark suite. Runs offline and prints results as JSON, so that runs of different releases can be compared.
+
+    python tests/performance.py --output before.json
+    python tests/performance.py --quick
+
+Optionally compares with similar modules (tldextract, tld) if they are installed, see --compare.
 @author: Jophy and Wu Tingfeng
 @file: performance.py
 
@@ -10,47 +15,411 @@ Copyright (c) 2022 Wu Tingfeng
 Copyright (c) 2017-2018 Jophy
 """
 
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
 import sys
+import threading
 import time
+import tracemalloc
+
+import fasttld
+from fasttld import FastTLDExtract, SharedFastTLDExtract, psl
+from fasttld.FastTLDExtract import IP_FIRST_CHARS, URL_RE, looks_like_ip
+
+ENGINES = ["dict", "compact", "mmap"]
+
+SCHEMES = ["http://", "https://", "ftp://", ""]
+PATHS = ["", "/", "/a/long/path?query=42", "/index.html#top", "/search?q=fasttld&lang=en"]
+WORDS = ["www", "mail", "api", "cdn", "static", "img", "news", "blog", "shop", "login", "m", "dev", "eu", "us"]
+NAMES = ["google", "baidu", "jophy", "example", "wikipedia", "amazon", "github", "bbc", "yandex", "qq"]
+IDN_NAMES = ["食狮", "例子", "пример", "bücher", "παράδειγμα", "مثال", "テスト"]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(values):
+    """Statistics of a list of timings, in the unit of the values."""
+    values = sorted(values)
+    n = len(values)
+    mean = sum(values) / n
+    stdev = (sum((v - mean) ** 2 for v in values) / (n - 1)) ** 0.5 if n > 1 else 0.0
+    return {
+        "n": n,
+        "min": values[0],
+        "mean": mean,
+        "stdev": stdev,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def build_corpora(size, seed):
+    """
+    Build reproducible synthetic URL corpora from the bundled public suffix list.
+    :return: Dict(corpus name -> list of URLs)
+    """
+    rng = random.Random(seed)
+    rules = psl.getPublicSuffixList("")[2]
+    plain_rules = [r for r in rules if "*" not in r and not r.startswith("!")]
+    wildcard_rules = [r for r in rules if r.startswith("*.")]
+    exception_rules = [r[1:] for r in rules if r.startswith("!")]
+
+    def host(suffix, labels=1):
+        return ".".join([rng.choice(WORDS) for _ in range(labels - 1)] + [rng.choice(NAMES), suffix])
+
+    def ip():
+        return ".".join(str(rng.randint(0, 255)) for _ in range(4))
+
+    def ipv6():
+        return "[%s]" % ":".join("%x" % rng.randint(0, 0xffff) for _ in range(8))
 
-import tldextract
-from fasttld import FastTLDExtract
-from tld import get_tld
-
-cases = [
-         'jophy.com',
-         'www.baidu.com.cn',
-         'jo.noexist',
-         'https://maps.google.com.ua/a/long/path?query=42',
-         '1.1.1.1', 'https://192.168.1.1'
-        ]
-
-if sys.version_info.major == 2:
-    range = xrange  # type: ignore
-
-num_iterations = 10000000
-
-t = FastTLDExtract(exclude_private_suffix=True)
-
-test_cases = [('fasttld_with_subdomains',
-              t.extract,
-              {'subdomain': True}),
-              ('tldextract',
-               tldextract.extract,
-              {}),
-              ('tld',
-              get_tld,
-              {'fix_protocol': True, 'fail_silently': True}),
-              ('fasttld_without_subdomains',
-               t.extract,
-              {'subdomain': False})
-              ]
-
-for test_case in test_cases:
-    module, extractor, kwargs = test_case
-    for url in cases:
+    corpora = {
+        "simple": [host(rng.choice(["com", "net", "org", "co.uk", "com.cn", "de"]), rng.randint(1, 2))
+                   for _ in range(size)],
+        "psl_rules": [host(rng.choice(plain_rules), rng.randint(1, 3)) for _ in range(size)],
+        "long_subdomains": [host(rng.choice(plain_rules), rng.randint(5, 10)) for _ in range(size)],
+        "idn": ["%s.%s.%s" % (rng.choice(WORDS), rng.choice(IDN_NAMES), rng.choice(["com", "中国", "рф", "公司.香港"]))
+                for _ in range(size)],
+        "wildcard_exception": [
+            host(rng.choice(wildcard_rules).replace("*", rng.choice(WORDS)), rng.randint(1, 2))
+            if rng.random() < 0.7 else "%s.%s" % (rng.choice(WORDS), rng.choice(exception_rules))
+            for _ in range(size)
+        ],
+        "ip": [ip() if rng.random() < 0.8 else "%s%s:%d/" % (rng.choice(SCHEMES), ip(), rng.randint(1, 65535))
+               for _ in range(size)],
+        "ipv6": ["%s%s:%d/" % (rng.choice(SCHEMES), ipv6(), rng.randint(1, 65535)) if rng.random() < 0.5 else ipv6()
+                 for _ in range(size)],
+        "unmatched": [host(rng.choice(["noexist", "invalid-tld", "local", "internal"]), rng.randint(1, 3))
+                      for _ in range(size)],
+        "full_urls": [
+            "%s%s%s%s%s" % (
+                rng.choice(SCHEMES),
+                "user:pass@" if rng.random() < 0.1 else "",
+                host(rng.choice(plain_rules), rng.randint(1, 4)),
+                ":%d" % rng.randint(1, 65535) if rng.random() < 0.3 else "",
+                rng.choice(PATHS),
+            )
+            for _ in range(size)
+        ],
+    }
+    corpora["mixed"] = [url for corpus in corpora.values() for url in corpus]
+    rng.shuffle(corpora["mixed"])
+    return corpora
+
+
+# Run in a fresh interpreter by bench_import(). Prints timings in ms, and the heavy modules imported by `import fasttld`
+IMPORT_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import fasttld
+t1 = time.perf_counter()
+heavy_modules = sorted(m for m in ("idna", "socket", "hashlib", "tempfile", "fasttld.compact") if m in sys.modules)
+extractor = fasttld.FastTLDExtract(lazy=True)
+t2 = time.perf_counter()
+extractor.extract("www.google.com.hk")
+t3 = time.perf_counter()
+print(json.dumps({
+    "import": (t1 - t0) * 1e3,
+    "lazy_construction": (t2 - t1) * 1e3,
+    "first_extract": (t3 - t2) * 1e3,
+    "total": (t3 - t0) * 1e3,
+    "heavy_modules": heavy_modules,
+}))
+"""
+
+
+def bench_import(repeat):
+    """
+    Time `import fasttld` and the first extract() of a lazy instance, each run in a fresh interpreter.
+    Also reports which heavy modules the import pulled in, so that startup regressions show up.
+    """
+    # Import the same fasttld package as this process
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(fasttld.__file__)))
+    runs = []
+    for _ in range(max(repeat, 3)):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT], cwd=package_parent)
+        runs.append(json.loads(output.decode()))
+    results = dict((key, summarize([run[key] for run in runs]))
+                   for key in ("import", "lazy_construction", "first_extract", "total"))
+    results["heavy_modules"] = runs[-1]["heavy_modules"]
+    return {"unit": "ms", "results": results}
+
+
+def bench_construction(engines, repeat):
+    """Time FastTLDExtract() construction, with and without trie snapshots."""
+    results = {}
+    for engine in engines:
+        for snapshot in (False, True):
+            FastTLDExtract(engine=engine, snapshot=snapshot)  # warm up, writes snapshots
+            timings = []
+            for _ in range(repeat):
+                t1 = time.perf_counter()
+                FastTLDExtract(engine=engine, snapshot=snapshot)
+                timings.append((time.perf_counter() - t1) * 1e3)
+            results["%s%s" % (engine, "_snapshot" if snapshot else "")] = summarize(timings)
+    return {"unit": "ms", "results": results}
+
+
+def bench_latency(extract, urls, batch=50, **kwargs):
+    """
+    Per-call latency distribution. Calls are timed in small batches to keep timer overhead out of the results.
+    :return: Summary in microseconds per call
+    """
+    timings = []
+    perf_counter = time.perf_counter
+    for i in range(0, len(urls) - batch + 1, batch):
+        chunk = urls[i:i + batch]
+        t1 = perf_counter()
+        for url in chunk:
+            extract(url, **kwargs)
+        timings.append((perf_counter() - t1) * 1e6 / batch)
+    return summarize(timings)
+
+
+def bench_throughput(extract_many, urls, repeat):
+    """:return: Summary of URLs per second"""
+    rates = []
+    for _ in range(repeat):
         t1 = time.perf_counter()
-        for i in range(1, num_iterations):
-            extractor(url, **kwargs)  # type: ignore
-        print("%s on '%s' : %.2fs" % (module, url, time.perf_counter() - t1))
-    print("")
+        extract_many(urls)
+        rates.append(len(urls) / (time.perf_counter() - t1))
+    return summarize(rates)
+
+
+def bench_memory(engines):
+    """Size of the trie, and peak memory allocated while constructing an instance."""
+    results = {}
+    for engine in engines:
+        gc.collect()
+        tracemalloc.start()
+        extractor = FastTLDExtract(engine=engine)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[engine] = {"trie_bytes": extractor.memory_usage(), "construction_peak_bytes": peak}
+    return {"unit": "bytes", "results": results}
+
+
+def bench_dedup(urls, repeat, unique_counts=(10, 100, 1000)):
+    """
+    Throughput of extract_many_dedup() against extract_many() on repetitive input, eg. access logs,
+    made of len(urls) rows with a few distinct hosts, each row with its own path.
+    :return: Summary of URLs per second, and the dedup ratio, for each number of distinct hosts
+    """
+    extractor = FastTLDExtract()
+    rng = random.Random(0)
+    results = {}
+    for unique_count in unique_counts:
+        distinct = urls[:unique_count]
+        rows = ["%s/%d" % (rng.choice(distinct), i) for i in range(len(urls))]
+        result = {}
+        for name, extract_many in (("extract_many", extractor.extract_many),
+                                   ("extract_many_dedup", extractor.extract_many_dedup)):
+            result[name] = bench_throughput(extract_many, rows, repeat)
+        result["ratio"] = extractor.extract_many_dedup(rows)[1].ratio
+        results["%d_unique" % unique_count] = result
+    return {"unit": "urls/s", "results": results}
+
+
+def bench_bytes(urls, repeat):
+    """
+    Throughput of extracting the lines of a raw log buffer: decoded and split into str lines for extract(),
+    split into bytes lines for extract_bytes(), returning slices or offsets, or split into memoryview lines
+    that refer to the buffer without copying it.
+    :return: Summary of URLs per second for each way
+    """
+    extractor = FastTLDExtract()
+    buffer = "\n".join(urls).encode("utf-8")
+
+    def decode_extract(buffer):
+        extract = extractor.extract
+        return [extract(line) for line in buffer.decode("utf-8").split("\n")]
+
+    def bytes_extract(buffer, spans=False):
+        extract_bytes = extractor.extract_bytes
+        return [extract_bytes(line, True, spans) for line in buffer.split(b"\n")]
+
+    def memoryview_extract(buffer):
+        extract_bytes = extractor.extract_bytes
+        view = memoryview(buffer)
+        results = []
+        start = 0
+        while start <= len(buffer):
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                end = len(buffer)
+            results.append(extract_bytes(view[start:end], True, True))
+            start = end + 1
+        return results
+
+    results = {}
+    for name, extract_buffer in (("decode_extract", decode_extract),
+                                 ("extract_bytes", bytes_extract),
+                                 ("extract_bytes_spans", lambda buffer: bytes_extract(buffer, True)),
+                                 ("memoryview_spans", memoryview_extract)):
+        rates = []
+        for _ in range(repeat):
+            t1 = time.perf_counter()
+            extract_buffer(buffer)
+            rates.append(len(urls) / (time.perf_counter() - t1))
+        results[name] = summarize(rates)
+    return {"unit": "urls/s", "results": results}
+
+
+def bench_threads(urls, repeat, thread_counts=(1, 2, 4, 8)):
+    """
+    Throughput of one SharedFastTLDExtract shared by several threads, each extracting its own share of urls.
+    On free-threaded CPython builds (3.13t and later) the throughput grows with the number of threads,
+    with the GIL it stays flat.
+    :return: Summary of URLs per second, for each number of threads, with and without host cache
+    """
+    results = {}
+    for cache_size in (0, 10000):
+        extractor = SharedFastTLDExtract(cache_size=cache_size)
+        for count in thread_counts:
+            shares = [urls[i::count] for i in range(count)]
+            rates = []
+            for _ in range(repeat):
+                barrier = threading.Barrier(count + 1)
+
+                def work(share):
+                    barrier.wait()
+                    extractor.extract_many(share)
+
+                threads = [threading.Thread(target=work, args=(share,)) for share in shares]
+                for thread in threads:
+                    thread.start()
+                barrier.wait()
+                t1 = time.perf_counter()
+                for thread in threads:
+                    thread.join()
+                rates.append(len(urls) / (time.perf_counter() - t1))
+            results["%d_threads%s" % (count, "_cache" if cache_size else "")] = summarize(rates)
+    return {"unit": "urls/s", "results": results}
+
+
+def inet_aton_looks_like_ip(maybe_ip):
+    """IP check of fasttld 0.x: try inet_aton() on every host, and catch the exception for host names."""
+    import socket
+    try:
+        socket.inet_aton(maybe_ip)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def bench_ip_detection(corpora, repeat):
+    """Time the IP check of _lookup_host() against inet_aton_looks_like_ip(), on the hosts of each corpus."""
+    def fasttld_check(host):
+        return host[:1] in IP_FIRST_CHARS and looks_like_ip(host)
+
+    results = {}
+    for name, urls in sorted(corpora.items()):
+        hosts = [URL_RE.match(url).group(3) for url in urls]
+        results[name] = {}
+        for check_name, check in (("fasttld", fasttld_check), ("inet_aton", inet_aton_looks_like_ip)):
+            timings = []
+            for _ in range(repeat):
+                t1 = time.perf_counter()
+                for host in hosts:
+                    check(host)
+                timings.append((time.perf_counter() - t1) * 1e9 / len(hosts))
+            results[name][check_name] = summarize(timings)
+    return {"unit": "ns", "results": results}
+
+
+def bench_compare(corpora, repeat):
+    """Compare with tldextract and tld, if installed. These may access the network."""
+    results = {}
+    extractors = {}
+    try:
+        import tldextract
+        extractors["tldextract"] = tldextract.extract
+    except ImportError:
+        pass
+    try:
+        from tld import get_tld
+        extractors["tld"] = lambda url: get_tld(url, fix_protocol=True, fail_silently=True)
+    except ImportError:
+        pass
+    for module, extract in sorted(extractors.items()):
+        results[module] = dict(
+            (name, bench_latency(lambda url: extract(url), urls)) for name, urls in sorted(corpora.items())
+        )
+    return {"unit": "us", "results": results}
+
+
+def run(args):
+    corpora = build_corpora(args.corpus_size, args.seed)
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "seed": args.seed,
+            "corpus_size": args.corpus_size,
+            "repeat": args.repeat,
+            # False on free-threaded builds, see bench_threads()
+            "gil_enabled": sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True,
+        },
+        "import": bench_import(args.repeat),
+        "construction": bench_construction(args.engines, args.repeat),
+        "memory": bench_memory(args.engines),
+        "ip_detection": bench_ip_detection(corpora, args.repeat),
+        "threads": bench_threads(corpora["mixed"], args.repeat),
+        "dedup": bench_dedup(corpora["mixed"], args.repeat),
+        "bytes": bench_bytes(corpora["full_urls"], args.repeat),
+        "latency": {"unit": "us", "results": {}},
+        "throughput": {"unit": "urls/s", "results": {}},
+    }
+    for engine in args.engines:
+        extractor = FastTLDExtract(engine=engine)
+        latency = report["latency"]["results"][engine] = {}
+        throughput = report["throughput"]["results"][engine] = {}
+        for name, urls in sorted(corpora.items()):
+            latency[name] = bench_latency(extractor.extract, urls)
+            throughput[name] = bench_throughput(extractor.extract_many, urls, args.repeat)
+        latency["mixed_no_subdomain"] = bench_latency(extractor.extract, corpora["mixed"], subdomain=False)
+    if args.compare:
+        report["compare"] = bench_compare(corpora, args.repeat)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="fasttld benchmark suite")
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--corpus-size", type=int, default=20000, help="URLs per synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of construction and throughput runs")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the synthetic corpora")
+    parser.add_argument("--engines", type=lambda s: s.split(","), default=ENGINES,
+                        help="comma-separated engines to benchmark (default: %s)" % ",".join(ENGINES))
+    parser.add_argument("--quick", action="store_true", help="small corpora and few repetitions, for smoke tests")
+    parser.add_argument("--compare", action="store_true", help="also benchmark tldextract and tld if installed")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.corpus_size = min(args.corpus_size, 1000)
+        args.repeat = min(args.repeat, 2)
+
+    report = run(args)
+    output = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as fd:
+            fd.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()